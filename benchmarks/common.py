@@ -0,0 +1,52 @@
+"""
+Shared setup for the benchmark scripts, which are run from the repository
+root, e.g. ``python benchmarks/markdown_pool.py``.
+"""
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def setup_django(database=':memory:', **markdown_page):
+    """Configure a minimal project using ``mdpage`` and, if needed, migrate its database."""
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        SECRET_KEY='mdpage-benchmarks',
+        USE_TZ=True,
+        DEFAULT_AUTO_FIELD='django.db.models.AutoField',
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'taggit',
+            'mdpage',
+        ],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': database}},
+        MARKDOWN_PAGE=markdown_page,
+    )
+    django.setup()
+
+
+def migrate():
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def best_of(*funcs, repeat=3):
+    """
+    The fastest of ``repeat`` timings of each of ``funcs``, in seconds. Runs are
+    interleaved so that drift in machine load affects every function alike.
+    """
+    timings = [[] for _ in funcs]
+    for _ in range(repeat):
+        for func, times in zip(funcs, timings):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+    return [min(times) for times in timings]
@@ -0,0 +1,84 @@
+"""
+Compare the line diff algorithms of ``DiffPatch.diff`` on synthetic page
+revisions: prose with scattered edits, pages of heavily repeated lines
+(tables and code fences) and the bundled markdown cheatsheet with edits.
+Each diff is checked to patch the old text into the new one.
+"""
+import random
+import argparse
+
+from common import ROOT, best_of
+
+from mdpage.diffpatch import DIFF_ALGORITHMS, DiffPatch
+
+CHEATSHEET = ROOT / 'mdpage' / 'templates' / 'mdpage' / 'cheatsheet.text'
+
+
+def edit(lines, rnd, count):
+    """Return ``lines`` with ``count`` random line insertions, deletions and changes."""
+    lines = list(lines)
+    for _ in range(count):
+        pos = rnd.randrange(len(lines) + 1)
+        action = rnd.choice('idc')
+        if action == 'i' or pos == len(lines):
+            lines.insert(pos, f'inserted line {rnd.random()}')
+        elif action == 'd':
+            del lines[pos]
+        else:
+            lines[pos] = lines[pos] + ' changed'
+
+    return lines
+
+
+def prose(rnd, size):
+    words = 'the quick brown fox jumps over a lazy dog while pages render'.split()
+    return [' '.join(rnd.choices(words, k=12)) for _ in range(size)]
+
+
+def repetitive(rnd, size):
+    rows = ['| --- | --- |', '| a | b |', '```', '    code', '', '- item']
+    return [rnd.choice(rows) for _ in range(size)]
+
+
+def cases(rnd, size):
+    for name, make in (('prose', prose), ('repetitive', repetitive)):
+        lines = make(rnd, size)
+        for edits in (10, size // 10):
+            yield f'{name} {size} lines, {edits} edits', lines, edit(lines, rnd, edits)
+
+    lines = CHEATSHEET.read_text().split('\n')
+    yield f'cheatsheet {len(lines)} lines, 20 edits', lines, edit(lines, rnd, 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=5000, help='lines per page (default: 5000)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    algorithms = list(DIFF_ALGORITHMS)
+    print(f'{"":>36}' + ''.join(f'{name:>16}' for name in algorithms))
+    for name, old, new in cases(rnd, args.size):
+        sizes = []
+        for algorithm in algorithms:
+            diff = DiffPatch.diff(old, new, algorithm=algorithm)
+            result = DiffPatch.patch(diff + '\n', '\n'.join(old) + '\n')
+            if not result or str(result) != '\n'.join(new) + '\n':
+                raise SystemExit(f'{algorithm} diff does not apply for {name}')
+
+            sizes.append(diff.count('\n'))
+
+        timings = best_of(*(
+            (lambda algorithm=algorithm: DiffPatch.diff(old, new, algorithm=algorithm))
+            for algorithm in algorithms
+        ), repeat=args.repeat)
+        print(f'{name:>36}' + ''.join(
+            f'{t * 1000:9.1f}ms {size:5d}' for t, size in zip(timings, sizes)
+        ))
+
+    print('(time, and diff length in lines)')
+
+
+if __name__ == '__main__':
+    main()
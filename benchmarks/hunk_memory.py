@@ -0,0 +1,90 @@
+"""
+Measure the memory taken by parsed patches, scaling the ``tests/data``
+corpus up to a few million diff lines. The compact ``Hunk`` storage (one
+string of line contents per hunk with parallel offset and op-code arrays) is
+compared with the layout ``diffpatch`` used before: a ``__dict__``-backed
+object per hunk holding a list with one ``str`` per line.
+"""
+import re
+import sys
+import time
+import argparse
+import resource
+from itertools import count
+
+from common import ROOT
+
+from mdpage import diffpatch
+
+DATA = ROOT / 'tests' / 'data'
+re_filename = re.compile(r'^((?:---|\+\+\+) (?:[ab]/)?)(\S+)', re.M)
+
+
+class DictHunk:
+    """The per-hunk layout before slots: attributes in a dict, a str per line."""
+
+    def __init__(self, hunk):
+        self.start_src = hunk.start_src
+        self.start_tgt = hunk.start_tgt
+        self.lines_src = hunk.lines_src
+        self.lines_tgt = hunk.lines_tgt
+        self.invalid = hunk.invalid
+        self.desc = hunk.desc
+        self.text = list(hunk.text)
+
+    def size(self):
+        return (
+            sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.text) +
+            sum(sys.getsizeof(line) for line in self.text)
+        )
+
+
+def compact_size(hunk):
+    return sum(sys.getsizeof(part) for part in (hunk, hunk.data, hunk.ends, hunk.ops))
+
+
+def corpus_patches():
+    return [
+        path.read_text() for path in sorted(DATA.iterdir())
+        if path.suffix in ('.patch', '.diff') and diffpatch.PatchSet.fromstring(path.read_text())
+    ]
+
+
+def generate_lines(patches, total):
+    """Yield the corpus patches over and over, under fresh file names, for ``total`` lines."""
+    produced = 0
+    for n in count():
+        for text in patches:
+            renamed = re_filename.sub(lambda m: f'{m.group(1)}{n}/{m.group(2)}', text)
+            for line in renamed.splitlines(keepends=True):
+                yield line
+                produced += 1
+
+            if produced >= total:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=2000000, help='diff lines (default: 2000000)')
+    args = parser.parse_args()
+
+    patches = corpus_patches()
+    start = time.perf_counter()
+    patchset = diffpatch.PatchSet.fromstring(generate_lines(patches, args.lines))
+    elapsed = time.perf_counter() - start
+    hunks = [hunk for patch in patchset for hunk in patch]
+    lines = sum(len(hunk.ops) for hunk in hunks)
+    print(f'{args.lines} diff lines parsed in {elapsed:.1f}s')
+    print(f'{len(patchset)} patches, {len(hunks)} hunks, {lines} hunk lines')
+
+    compact = sum(compact_size(hunk) for hunk in hunks)
+    listed = sum(DictHunk(hunk).size() for hunk in hunks)
+    for name, size in (('compact', compact), ('dict', listed)):
+        print(f'{name:>8} hunks: {size / 2**20:8.1f}MB, {size / lines:6.1f} bytes per line')
+
+    print(f'peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare markdown conversions per second with a new ``MDPageMarkdown`` built
+from freshly filtered settings per call, as ``mdpage_markdown`` used to,
+against the pooled converters, for whole pages and for the short snippets
+typical of ``{% markdown %}`` tags.
+"""
+import random
+import argparse
+
+from common import best_of, setup_django
+
+WORDS = 'alpha beta gamma delta *em* **strong** `code` [[Link Page]] epsilon'.split()
+
+
+def make_page(rnd):
+    parts = []
+    for i in range(rnd.randint(1, 4)):
+        parts.append(f'## Heading {i}')
+        parts.append(' '.join(rnd.choice(WORDS) for _ in range(30)))
+        parts.append('| a | b |\n|---|---|\n| 1 | 2 |')
+
+    return '\n\n'.join(parts)
+
+
+def make_snippet(rnd):
+    return ' '.join(rnd.choice(WORDS) for _ in range(5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=3000, help='corpus size (default: 3000)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django(markdown_mdpage_link=lambda title: f'/wiki/{title}/')
+    from mdpage.conf import get_settings
+    from mdpage.utils.markdown import MDPageMarkdown, get_markdown_settings, pool
+
+    rnd = random.Random(1)
+    settings = get_markdown_settings(None)
+    for name, make in (('pages', make_page), ('snippets', make_snippet)):
+        corpus = [make(rnd) for _ in range(args.pages)]
+
+        def fresh():
+            for text in corpus:
+                MDPageMarkdown({
+                    k.replace('markdown_', '', 1): v for k, v in get_settings().items()
+                    if k.startswith('markdown_')
+                }).convert(text)
+
+        def pooled():
+            for text in corpus:
+                pool.convert(text, settings)
+
+        fresh_time, pooled_time = best_of(fresh, pooled, repeat=args.repeat)
+        print(
+            f'{name:>8}: fresh {len(corpus) / fresh_time:8.0f}/s  '
+            f'pooled {len(corpus) / pooled_time:8.0f}/s  '
+            f'({fresh_time / pooled_time:.2f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
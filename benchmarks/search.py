@@ -0,0 +1,96 @@
+"""
+Compare ``?search=`` latency of the search backends on a synthetic corpus:
+the ``LIKE`` scan that ``PageQuerySetMixin.search`` used before, SQLite FTS5
+and the in-process inverted index. Each query is timed as the landing view
+runs it, a count and the first page of results.
+"""
+import random
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from common import best_of, migrate, setup_django
+
+QUERIES = ['common0', 'rare7 rare9', 'middle12', 'absent', 'common3 middle40 rare2']
+
+
+def make_vocabulary():
+    return (
+        [f'common{i}' for i in range(10)] * 50 +
+        [f'middle{i}' for i in range(100)] * 5 +
+        [f'rare{i}' for i in range(2000)] +
+        [f'filler{i}' for i in range(5000)]
+    )
+
+
+def populate(count, words):
+    from mdpage.models import MarkdownPage, MarkdownPageType
+
+    rnd = random.Random(1)
+    mdp_type = MarkdownPageType.objects.create(prefix='wiki', status='PUB', is_live=True)
+    batch = []
+    for i in range(count):
+        batch.append(MarkdownPage(
+            type=mdp_type,
+            slug=f'page-{i}',
+            title=f'Page {i} {rnd.choice(words)}',
+            text=' '.join(rnd.choices(words, k=200)),
+            status='PUB',
+            is_live=True,
+        ))
+        if len(batch) == 1000:
+            MarkdownPage.objects.bulk_create(batch)
+            batch = []
+
+    MarkdownPage.objects.bulk_create(batch)
+    return mdp_type
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=50000, help='corpus size (default: 50000)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(database=str(Path(tmp) / 'search.sqlite3'))
+        migrate()
+
+        from django.db import connection
+        from mdpage.models import MarkdownPage
+        from mdpage.search import (
+            InvertedIndexSearchBackend,
+            LikeSearchBackend,
+            SQLiteSearchBackend,
+        )
+
+        start = time.perf_counter()
+        mdp_type = populate(args.pages, make_vocabulary())
+        print(f'{args.pages} pages created in {time.perf_counter() - start:.1f}s')
+
+        backends = [('like', LikeSearchBackend())]
+        if SQLiteSearchBackend.is_available(connection):
+            backends.append(('fts5', SQLiteSearchBackend()))
+
+        index = InvertedIndexSearchBackend()
+        start = time.perf_counter()
+        index.get_index(mdp_type.pk)
+        print(f'inverted index built in {time.perf_counter() - start:.1f}s')
+        backends.append(('index', index))
+
+        pages = MarkdownPage.objects.published(type=mdp_type)
+        print(f'{"query":>24}' + ''.join(f'{name:>12}' for name, backend in backends))
+        for query in QUERIES:
+            def run(backend):
+                results = backend.search(pages, query, mdp_type)
+                return results.count(), list(results[:20])
+
+            timings = best_of(*(
+                (lambda backend=backend: run(backend)) for name, backend in backends
+            ), repeat=args.repeat)
+            print(f'{query:>24}' + ''.join(f'{t * 1000:10.1f}ms' for t in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class MDPageConfig(AppConfig):
     name = 'mdpage'
+
+    def ready(self):
+        from .conf import get_settings
+        from .scheduler import scheduler
+
+        if get_settings()['live_scheduler']:
+            # started with the first request rather than here, so that
+            # management commands such as migrate do not run it
+            request_started.connect(scheduler.start, dispatch_uid='mdpage-live-scheduler')
@@ -3,9 +3,28 @@ from functools import lru_cache
 from django.conf import settings
 
 DEFAULT_SETTINGS = {
+    'archive_deltas': False,
+    'archive_keyframe_interval': 20,
+    'compare_page_size': 20,
+    'compress_html': False,
+    'diff_algorithm': 'myers',
+    'diff_cache_alias': None,
+    'diff_cache_table': False,
+    'diff_cache_timeout': None,
+    'fragment_cache_alias': None,
+    'fragment_cache_timeout': 300,
+    'history_page_size': 50,
+    'listing_count': None,
     'listing_layout': 'list',
+    'listing_page_size': 100,
+    'live_scheduler': False,
     'markdown_mdpage_re': r'\[\[([^]]+)\]\]',
     'markdown_table_classes': 'table table-striped table-bordered',
+    'render_cache_alias': None,
+    'render_cache_chars': 4000000,
+    'render_cache_timeout': None,
+    'search_backend': None,
+    'search_config': 'english',
 }
 
 project_settings = getattr(settings, 'MARKDOWN_PAGE', {})
@@ -14,13 +14,21 @@ __license__ = "MIT"
 __url__ = "https://github.com/techtonik/python-patch"
 __maintainer__ = "david krauth <dakrauth@gmail.com>"
 
+import os
 import re
 import sys
 import copy
+import json
 import logging
 import difflib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path as _BasePath
 from io import StringIO
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Sequence
 from itertools import count
 from datetime import datetime, timezone
 
@@ -36,19 +44,63 @@ class Path(type(_BasePath())):
         ).astimezone().isoformat()
 
 
+SPACE, PLUS, MINUS, BACKSLASH = map(ord, ' +-\\')
+
+
 class NoMatch(Exception):
     pass
 
 
 class Counter:
+    __slots__ = ('counter', )
     _counter = count()
 
     def __init__(self):
         self.counter = next(self.__class__._counter)
 
 
+class HunkLines(Sequence):
+    """
+    Read-only view of a hunk's lines, each materialized on access as the op
+    character followed by the line content (including its line ending).
+    """
+    __slots__ = ('hunk', )
+
+    def __init__(self, hunk):
+        self.hunk = hunk
+
+    def __len__(self):
+        return len(self.hunk.ops)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        return chr(self.hunk.ops[index]) + self.hunk.line(index)
+
+    def __iter__(self):
+        ops, ends, data = self.hunk.ops, self.hunk.ends, self.hunk.data
+        start = 0
+        for op, end in zip(ops, ends):
+            yield chr(op) + data[start:end]
+            start = end
+
+
 class Hunk(Counter):
-    """ Parsed hunk data container (hunk starts with @@ -R +R @@) """
+    """
+    Parsed hunk data container (hunk starts with @@ -R +R @@)
+
+    Line contents are stored back to back in the single string ``data``, with
+    ``ends`` holding the end offset of each line and ``ops`` its op character
+    (one of `` +-\\``) in parallel arrays; ``text`` gives a list-like view.
+    The ``inserted`` and ``deleted`` line counts and the size change in bytes,
+    ``delta``, are kept up to date as lines are appended.
+    """
+    __slots__ = (
+        'start_src', 'start_tgt', 'invalid', 'lines_src', 'lines_tgt', 'desc',
+        'index', 'patch', 'data', 'ends', 'ops', '_pending',
+        'inserted', 'deleted', 'delta',
+    )
 
     def __init__(self, **kwargs):
         super().__init__()
@@ -60,15 +112,76 @@ class Hunk(Counter):
         self.lines_tgt = 1
 
         self.desc = ''
-        self.text = []
-        self.__dict__.update(kwargs)
+        self.index = None
+        self.patch = None
+        self.data = ''
+        self.ends = array('I')
+        self.ops = array('B')
+        self._pending = []
+        self.inserted = self.deleted = self.delta = 0
+        for key, value in kwargs.items():
+            setattr(self, key, value)
 
     def __str__(self):
         return f'<Hunk {self.counter}>'
 
+    def append(self, line):
+        """Add a raw hunk line, op character first."""
+        op = ord(line[0])
+        size = len(line) - 1
+        self.ops.append(op)
+        self._pending.append(line[1:])
+        self.ends.append((self.ends[-1] if self.ends else 0) + size)
+        if op == PLUS:
+            self.inserted += 1
+            self.delta += size
+        elif op == MINUS:
+            self.deleted += 1
+            self.delta -= size
+
+    def freeze(self):
+        """Join the pending lines into ``data``; called once the hunk is complete."""
+        if self._pending:
+            self.data += ''.join(self._pending)
+            self._pending = []
+
+    def line(self, index):
+        """Content of line ``index``, without the op character."""
+        self.freeze()
+        if index < 0:
+            index += len(self.ops)
+        return self.data[self.ends[index - 1] if index else 0:self.ends[index]]
+
+    @property
+    def text(self):
+        self.freeze()
+        return HunkLines(self)
+
+    def lines(self, ops):
+        """Contents of the lines whose op is in ``ops``, without line endings."""
+        self.freeze()
+        wanted = {ord(op) for op in ops}
+        data = self.data
+        lines = []
+        start = 0
+        for op, end in zip(self.ops, self.ends):
+            if op in wanted:
+                lines.append(data[start:end - 1] if data[end - 1:end] == '\n' else data[start:end])
+            start = end
+        return lines
+
+    def reverse(self):
+        """Swap added and removed lines."""
+        self.ops = array('B', (
+            MINUS if op == PLUS else PLUS if op == MINUS else op for op in self.ops
+        ))
+        self.inserted, self.deleted = self.deleted, self.inserted
+        self.delta = -self.delta
+
 
 class Patch(Counter):
     """ Patch for a single file. If used as an iterable, returns hunks."""
+    __slots__ = ('source', 'target', 'header', 'hunks', 'type')
 
     PLAIN = "plain"
     GIT = "git"
@@ -91,7 +204,20 @@ class Patch(Counter):
         for h in self.hunks:
             yield h
 
+    @property
+    def inserted(self):
+        return sum(h.inserted for h in self.hunks)
+
+    @property
+    def deleted(self):
+        return sum(h.deleted for h in self.hunks)
+
+    @property
+    def delta(self):
+        return sum(h.delta for h in self.hunks)
+
     def add(self, hunk):
+        hunk.freeze()
         hunk.index = len(self)
         hunk.patch = self
         self.hunks.append(hunk)
@@ -130,11 +256,33 @@ class Patch(Counter):
         return self.set_type(self.PLAIN)
 
 
+HunkResult = namedtuple('HunkResult', 'hunk status offset fuzz')
+
+
 class PatchResult:
 
+    APPLIED = 'applied'
+    ALREADY_APPLIED = 'already-applied'
+    CONFLICT = 'conflict'
+
     def __init__(self, content=''):
         self.errors = []
         self.content = content
+        self.hunks = []  # HunkResult tuples, in patch order
+
+    def hunk(self, hunk, status, offset=0, fuzz=0):
+        self.hunks.append(HunkResult(hunk, status, offset, fuzz))
+
+    def _count(self, status):
+        return sum(1 for h in self.hunks if h.status == status)
+
+    @property
+    def applied(self):
+        return self._count(self.APPLIED)
+
+    @property
+    def conflicts(self):
+        return self._count(self.CONFLICT)
 
     def error(self, msg):
         self.errors.append(msg)
@@ -147,23 +295,64 @@ class PatchResult:
         return self.content
 
 
+class PatchSetResult:
+    """ Aggregated result of applying every patch of a PatchSet to a directory tree."""
+
+    def __init__(self):
+        self.results = []  # (path, PatchResult) pairs, in patch order
+
+    def add(self, path, result):
+        self.results.append((path, result))
+
+    @property
+    def errors(self):
+        return [f'{path}: {msg}' for path, result in self.results for msg in result.errors]
+
+    def __bool__(self):
+        return bool(self.results) and all(result for path, result in self.results)
+
+    def __str__(self):
+        return '\n'.join(
+            f'{"ok" if result else "FAILED"} {path}' for path, result in self.results
+        )
+
+
 class Stream:
     """
     Enumerate wrapper that uses boolean end of stream status instead of
     StopIteration exception, and properties to access line information.
+
+    ``content`` is either the whole text (``str`` or ``bytes``) or any iterable
+    of lines, such as an open file or a generator, which is consumed lazily.
     """
 
     def __init__(self, content):
         if isinstance(content, bytes):
             content = content.decode()
 
-        assert isinstance(content, str)
-        self.content = content
+        if isinstance(content, str):
+            self.content = content
+            lines = StringIO(content)
+        else:
+            self.content = None
+            lines = (line.decode() if isinstance(line, bytes) else line for line in content)
+
         self.exhausted = False
-        self.enum = enumerate(StringIO(self.content))
+        self.enum = enumerate(lines)
 
     def __iter__(self):
-        return enumerate(StringIO(self.content), 1)
+        return enumerate(StringIO(self.read()), 1)
+
+    def read(self):
+        """
+        Return the content as one string. For an iterable, that is the lines not
+        yet read by ``next_line``, which are consumed and kept as the content.
+        """
+        if self.content is None:
+            self.content = ''.join(line for lineno, line in self.enum)
+            self.exhausted = True
+
+        return self.content
 
     def next_line(self):
         """
@@ -186,12 +375,24 @@ class Stream:
 class PatchSet:
     """ PatchSet is a patch parser and container. When used as an iterable, returns patches."""
 
+    # default number of context lines apply() may ignore to find a hunk
+    fuzz = 0
+
     @classmethod
     def fromfile(cls, filename):
         """ Parse patch file. If successful, returns PatchSet() object. Otherwise returns False."""
         logger.debug("reading %s" % filename)
+        ps = cls()
+        with open(filename) as fp:
+            ps.parse(Stream(fp))
+        return ps
+
+    @classmethod
+    def iterfile(cls, filename):
+        """ Parse patch file incrementally, yielding each Patch as it completes."""
+        logger.debug("streaming %s" % filename)
         with open(filename) as fp:
-            return cls.fromstring(fp.read())
+            yield from cls().iterparse(fp)
 
     @classmethod
     def fromstring(cls, s):
@@ -230,10 +431,33 @@ class PatchSet:
 
     def parse(self, stream):
         """parse unified diff return True on success"""
+        self.patches.extend(self.iterparse(stream))
+        if not self.patches:
+            return False
+
+        # XXX fix total hunks calculation
+        logger.debug("files: {},  hunks: {}".format(
+            len(self.patches),
+            sum(len(p) for p in self.patches))
+        )
+
+        # ---- detect patchset type ----
+        types = set(p.type for p in self.patches)
+        self.type = Patch.PLAIN if len(types) > 1 else types.pop()
+        return self.errors == 0
+
+    def iterparse(self, stream):
+        """
+        Parse unified diff from a string, ``Stream`` or any iterable of lines,
+        yielding each ``Patch`` as soon as it is complete. Patches are not kept
+        on the ``PatchSet``, so arbitrarily large diffs parse in bounded memory.
+        """
         self.errors = 0
-        if isinstance(stream, str):
+        if not isinstance(stream, Stream):
             stream = Stream(stream)
 
+        patch_count = 0
+
         next_hunk_no = 0    #: even if index starts with 0 user messages number hunks from 1
         patch = None
         hunk = None
@@ -263,6 +487,11 @@ class PatchSet:
             # deciders: these only switch state to decide who should process
             # line fetched at the start of this cycle
             if hunk_parsed:
+                if stream.line.startswith("\\"):
+                    # "\ No newline at end of file" following the last line of a hunk
+                    hunk.append(stream.line)
+                    continue
+
                 hunk_parsed = False
                 if re_hunk_start.match(stream.line):
                     hunk_head = True
@@ -314,7 +543,7 @@ class PatchSet:
                     elif not line.startswith("\\"):
                         hunk_actual["lines_src"] += 1
                         hunk_actual["lines_tgt"] += 1
-                    hunk.text.append(line)
+                    hunk.append(line)
                 else:
                     logger.warning(
                         f"invalid hunk {next_hunk_no} at {lineno+1} for target {patch.target}"
@@ -367,7 +596,7 @@ class PatchSet:
                     # switch to file_names state
                     hunk_skip = False
                     file_names = True
-                    if len(self.patches) > 0:
+                    if patch_count > 0:
                         logger.debug(f"{len(patch)} hunks for {patch}")
 
             if file_names:
@@ -422,7 +651,9 @@ class PatchSet:
                             head_scan = True
                         else:
                             if patch:  # for the first run patch is None
-                                self.patches.append(patch)
+                                patch.detect_type()
+                                patch_count += 1
+                                yield patch
 
                             patch = Patch(src_name, match.group(1).strip(), header)
                             src_name = None
@@ -454,8 +685,8 @@ class PatchSet:
                         start_src=int(match.group(1)),
                         start_tgt=int(match.group(4)),
                         desc=match.group(7)[1:].rstrip(),
-                        lines_src=int(match.group(3)) if match.group(3) else None,
-                        lines_tgt=int(match.group(6)) if match.group(6) else None,
+                        lines_src=int(match.group(3)) if match.group(3) else 1,
+                        lines_tgt=int(match.group(6)) if match.group(6) else 1,
                     )
 
                     hunk_actual["lines_src"] = hunk_actual["lines_tgt"] = 0
@@ -467,178 +698,362 @@ class PatchSet:
                     continue
         # /while stream.next_line()
 
-        if patch:
-            self.patches.append(patch)
-
         if not hunk_parsed:
             if hunk_skip:
                 logger.warning("warning: finished with errors, some hunks may be invalid")
             elif head_scan:
-                if len(self.patches) == 0:
+                if patch is None:
                     logger.warning("error: no patch data found!")
-                    return False
+                    return
                 else:  # extra data at the end of file
                     pass
             else:
                 logger.warning("error: patch stream is incomplete!")
                 self.errors += 1
-                if len(self.patches) == 0:
-                    return False
 
-        if len(self.patches) > 0:
+        if patch:
             logger.debug(f"- {len(patch)} hunks for {patch}")
+            patch.detect_type()
+            yield patch
 
-        # XXX fix total hunks calculation
-        logger.debug("files: {},  hunks: {}".format(
-            len(self.patches),
-            sum(len(p) for p in self.patches))
-        )
-
-        # ---- detect patch and patchset types ----
-        for item in self.patches:
-            item.detect_type()
-
-        types = set(p.type for p in self.patches)
-        self.type = self.PLAIN if len(types) > 1 else types.pop()
-        return self.errors == 0
-
-    def diffstat(self):
+    def diffstat(self, patches=None, format='text'):
         """calculate diffstat and return as a string
             Notes: - original diffstat ouputs target filename
                    - single + or - shouldn't escape histogram
+                   - ``patches`` may be any iterable of patches (e.g. from
+                     ``iterparse``), defaults to the parsed patches
+                   - ``format='json'`` returns the per-file and total counts
+                     as a JSON object instead
         """
-        names = []
-        insert = []
-        delete = []
-        delta = 0    # size change in bytes
-        namelen = 0
-        maxdiff = 0  # max number of changes for single file (for histogram width calculation)
-        for patch in self.patches:
-            i = d = 0
-            for hunk in patch:
-                for line in hunk.text:
-                    if line.startswith('+'):
-                        i += 1
-                        delta += len(line) - 1
-                    elif line.startswith('-'):
-                        d += 1
-                        delta -= len(line) - 1
-            names.append(patch.target)
-            insert.append(i)
-            delete.append(d)
-            namelen = max(namelen, len(patch.target))
-            maxdiff = max(maxdiff, i + d)
-
-        output = ''
+        files = [
+            (patch.target, patch.inserted, patch.deleted, patch.delta)
+            for patch in (self.patches if patches is None else patches)
+        ]
+        insert = sum(f[1] for f in files)
+        delete = sum(f[2] for f in files)
+        delta = sum(f[3] for f in files)   # size change in bytes
+
+        if format == 'json':
+            return json.dumps({
+                'files': [
+                    {'name': name, 'insertions': i, 'deletions': d, 'bytes': b}
+                    for name, i, d, b in files
+                ],
+                'files_changed': len(files),
+                'insertions': insert,
+                'deletions': delete,
+                'bytes': delta,
+            })
+
+        namelen = max((len(f[0]) for f in files), default=0)
+        # max number of changes for single file (for histogram width calculation)
+        maxdiff = max((f[1] + f[2] for f in files), default=0)
         statlen = len(str(maxdiff))  # stats column width
-        for i, n in enumerate(names):
-            # %-19s | %-4d %s
-            fmt = " %-" + str(namelen) + "s | %" + str(statlen) + "s %s\n"
+        # %-19s | %-4d %s
+        fmt = " %-" + str(namelen) + "s | %" + str(statlen) + "s %s\n"
+        width = len(fmt % ('', '', ''))
+        histwidth = max(2, 80 - width)
 
-            hist = ''
+        output = []
+        for name, i, d, _ in files:
             # -- calculating histogram --
-            width = len(fmt % ('', '', ''))
-            histwidth = max(2, 80 - width)
             if maxdiff < histwidth:
-                hist = "+" * insert[i] + "-" * delete[i]
+                hist = "+" * i + "-" * d
             else:
-                iratio = (float(insert[i]) / maxdiff) * histwidth
-                dratio = (float(delete[i]) / maxdiff) * histwidth
+                iratio = (float(i) / maxdiff) * histwidth
+                dratio = (float(d) / maxdiff) * histwidth
 
                 # make sure every entry gets at least one + or -
                 iwidth = 1 if 0 < iratio < 1 else int(iratio)
                 dwidth = 1 if 0 < dratio < 1 else int(dratio)
-                # print(iratio, dratio, iwidth, dwidth, histwidth)
                 hist = "+" * iwidth + "-" * dwidth
 
             # -- /calculating +- histogram --
-            output += (fmt % (names[i], str(insert[i] + delete[i]), hist))
+            output.append(fmt % (name, str(i + d), hist))
 
         return (
-            f"{output} {len(names)} files changed, {sum(insert)} insertions(+), "
-            f"{sum(delete)} deletions(-), {delta:+d} bytes"
+            f"{''.join(output)} {len(files)} files changed, {insert} insertions(+), "
+            f"{delete} deletions(-), {delta:+d} bytes"
         )
 
     def apply_file(self, filename, patch=None):
         with open(filename) as fp:
             return self.apply(fp.read(), patch)
 
-    def apply(self, stream, patch=None):
+    def _patch_path(self, root, name, strip):
+        if name == '/dev/null':
+            return None
+
+        parts = Path(name).parts[strip:]
+        path = root.joinpath(*parts).resolve()
+        if not parts or root not in path.parents:
+            raise ValueError(f'patch path {name} is outside of {root}')
+
+        return path
+
+    def _apply_to_tree(self, root, patch, strip):
+        """Apply ``patch`` to its file under ``root``, returning (path, result)."""
+        if strip is None:
+            strip = 1 if patch.type == Patch.GIT else 0
+
+        result = PatchResult()
+        try:
+            source = self._patch_path(root, patch.source, strip)
+            target = self._patch_path(root, patch.target, strip)
+        except ValueError as exc:
+            result.error(str(exc))
+            return patch.target, result
+
+        try:
+            if source is None:
+                content = ''
+            else:
+                with open(source, newline='') as fp:
+                    content = fp.read()
+        except OSError as exc:
+            result.error(f'cannot read {source}: {exc}')
+            return target or source, result
+
+        result = self.apply(content, patch)
+        return target or source, result
+
+    @staticmethod
+    def _write_atomic(path, content):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', newline='') as fp:
+                fp.write(content)
+            if path.exists():
+                os.chmod(tmp, path.stat().st_mode)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def apply_all(self, root, strip=None, workers=None, dry_run=False):
+        """
+        Apply every patch in the set to the files under the directory ``root``.
+        ``strip`` leading path components are removed from patch filenames
+        (like ``patch -p``; default 1 for git patches, 0 otherwise). Patches are
+        applied in memory concurrently; only if all succeed are the files written
+        back, each atomically via a temporary file and rename.
+        """
+        root = Path(root).resolve()
+        outcome = PatchSetResult()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            applied = list(executor.map(
+                lambda patch: self._apply_to_tree(root, patch, strip),
+                self.patches
+            ))
+
+        for path, result in applied:
+            outcome.add(path, result)
+
+        if outcome and not dry_run:
+            for (path, result), patch in zip(applied, self.patches):
+                if not result.applied:
+                    continue
+                elif patch.target == '/dev/null':
+                    path.unlink()
+                else:
+                    self._write_atomic(path, result.content)
+
+        return outcome
+
+    def apply(self, stream, patch=None, fuzz=None, max_offset=None):
+        """
+        Apply ``patch`` (default: the first patch) to the content of ``stream``
+        in a single pass over an index of its lines. Each hunk is recorded in
+        the result as applied, already applied (its target lines are present
+        instead) or a conflict; any conflict makes the result an error.
+
+        Like GNU patch, a hunk that doesn't match at its stated line is searched
+        for outward from there, up to ``max_offset`` lines away (default:
+        unlimited), and if still not found, retried ignoring up to ``fuzz`` lines
+        of leading and trailing context (default: ``self.fuzz``). The offset and
+        fuzz used are recorded for each hunk.
+        """
         patch = patch or self.patches[0]
+        fuzz = self.fuzz if fuzz is None else fuzz
         logger.debug(f"processing {patch}")
 
-        if isinstance(stream, str):
-            stream = Stream(stream)
-
-        hunk_no = 0
-        hunk_find = []
-        hunk_repl = []
-        valid_hunks = 0
+        content = stream.read() if isinstance(stream, Stream) else stream
+        if isinstance(content, bytes):
+            content = content.decode()
 
-        self.can_patch = False
-        hunk = patch.hunks[hunk_no]
+        # split on "\n" only, as the parser does; str.splitlines also splits on
+        # form feeds, "\r" and other separators. Lines keep their newline and
+        # are compared to hunk lines through _matches, without a stripped copy
+        lines = StringIO(content).readlines()
+        hashes = [hash(line[:-1] if line.endswith("\n") else line) for line in lines]
+        index = {}
+        for pos, value in enumerate(hashes):
+            index.setdefault(value, []).append(pos)
 
         result = PatchResult()
-        for lineno, line in stream:
-            if lineno < hunk.start_src:
+        output = []
+        cursor = 0
+        offset = 0
+        for hunk_no, hunk in enumerate(patch, 1):
+            find = hunk.lines(" -")
+            expected = (hunk.start_src - 1 if find else hunk.start_src) + offset
+            tried = set()
+            for level in range(fuzz + 1):
+                lead, trail = self._fuzz_context(hunk, level)
+                if (lead, trail) in tried:
+                    continue
+
+                tried.add((lead, trail))
+                trimmed = find[lead:len(find) - trail]
+                pos = self._locate(
+                    trimmed, lines, hashes, index, expected + lead, cursor, max_offset
+                )
+                if pos is not None:
+                    break
+
+            if pos is not None:
+                output.extend(lines[cursor:pos])
+                output.extend(self._hunk_output(hunk, lines, pos, lead, trail))
+                cursor = pos + len(trimmed)
+                offset = pos - lead - expected + offset
+                result.hunk(hunk, result.APPLIED, offset, level)
+                logger.debug(
+                    f"hunk #{hunk_no} for {patch} applied with offset {offset} fuzz {level}"
+                )
                 continue
-            elif lineno == hunk.start_src:
-                hunk_find = [x[1:-1] for x in hunk.text if x[0] in " -"]
-                hunk_repl = [x[1:-1] for x in hunk.text if x[0] in " +"]  # noqa
-                hunk_lineno = 0
-
-            # check hunks in source file
-            if lineno < hunk.start_src + len(hunk_find) - 1:
-                if line.rstrip("\n") == hunk_find[hunk_lineno]:
-                    hunk_lineno += 1
-                else:
-                    logger.info(
-                        f"file {patch.source} hunk {hunk_no+1} doesn't match source, line {lineno}"
-                    )
-                    logger.info("expected: {}".format(hunk_find[hunk_lineno]))
-                    logger.info("actual  : {}".format(line.rstrip("\n")))
-                    # not counting this as error, because file may already be patched.
-                    # check if file is already patched is done after the number of
-                    # invalid hunks if found
-
-                    # continue to check other hunks for completeness
-                    hunk_no += 1
-                    if hunk_no < len(patch):
-                        hunk = patch.hunks[hunk_no]
-                        continue
-                    else:
-                        break
-
-            # check if processed line is the last line
-            if lineno == hunk.start_src + len(hunk_find) - 1:
-                logger.debug(f"hunk #{hunk_no+1} for {patch} ready to be patched")
-                hunk_no += 1
-                valid_hunks += 1
-                if hunk_no < len(patch):
-                    hunk = patch.hunks[hunk_no]
-                else:
-                    if valid_hunks == len(patch):
-                        self.can_patch = True
-                        break
+
+            repl = hunk.lines(" +")
+            pos = (hunk.start_tgt - 1 if repl else hunk.start_tgt) + offset
+            if self._matches(lines, pos, repl):
+                result.hunk(hunk, result.ALREADY_APPLIED, offset)
+                logger.info(f"file {patch.source} hunk {hunk_no} is already applied")
+                continue
+
+            result.hunk(hunk, result.CONFLICT)
+            if hunk.start_src + len(find) - 1 > len(lines):
+                result.error(f"premature end of source file {patch} at {hunk_no}")
+            else:
+                logger.info(
+                    f"file {patch.source} hunk {hunk_no} doesn't match source, "
+                    f"line {hunk.start_src}"
+                )
+
+        if result.conflicts:
+            result.error(f"source file is different {patch}")
+        elif not result.applied:
+            logger.warning(f"already patched {patch}")
+            result.content = content
         else:
-            if hunk_no < len(patch):
-                result.error(f"premature end of source file {patch} at {hunk_no+1}")
+            output.extend(lines[cursor:])
+            result.content = ''.join(output)
+            logger.info(f"successfully patched {patch}")
+
+        return result
+
+    @staticmethod
+    def _fuzz_context(hunk, fuzz):
+        """Number of leading and trailing context lines to ignore at ``fuzz``."""
+        if not fuzz:
+            return 0, 0
+
+        ops = [op for op in hunk.ops if op != BACKSLASH]
+        lead = trail = 0
+        while lead < min(fuzz, len(ops)) and ops[lead] == SPACE:
+            lead += 1
+
+        while trail < min(fuzz, len(ops) - lead) and ops[-1 - trail] == SPACE:
+            trail += 1
+
+        return lead, trail
+
+    @staticmethod
+    def _matches(lines, pos, find):
+        """Whether the source ``lines`` from ``pos`` are the hunk lines ``find``."""
+        if pos < 0 or pos + len(find) > len(lines):
+            return False
+
+        for i, expected in enumerate(find, pos):
+            line = lines[i]
+            if line != expected and line != expected + "\n":
+                return False
+
+        return True
 
-        if valid_hunks < len(patch):
-            if self._match_file_hunks(StringIO(stream.content), patch.hunks):
-                logger.warning(f"already patched {patch}")
+    @staticmethod
+    def _locate(find, lines, hashes, index, expected, cursor, max_offset):
+        """
+        Return the source line index nearest ``expected`` (and not before
+        ``cursor``) where the lines ``find`` occur, or None. Candidates come from
+        the line hash ``index`` of the first line and are compared by hash
+        before the line contents are.
+        """
+        size = len(find)
+        if not size:
+            return expected if cursor <= expected <= len(lines) else None
+
+        candidates = index.get(hash(find[0]), [])
+        find_hashes = [hash(line) for line in find]
+        after = bisect_left(candidates, expected)
+        before = after - 1
+        while before >= 0 or after < len(candidates):
+            if after < len(candidates) and (
+                before < 0 or candidates[after] - expected <= expected - candidates[before]
+            ):
+                pos = candidates[after]
+                after += 1
             else:
-                result.error(f"source file is different {patch}")
+                pos = candidates[before]
+                before -= 1
+
+            if max_offset is not None and abs(pos - expected) > max_offset:
+                break
+
+            if (
+                pos >= cursor and
+                hashes[pos:pos + size] == find_hashes and
+                PatchSet._matches(lines, pos, find)
+            ):
+                return pos
 
-        if self.can_patch:
-            content = self.write_hunks(StringIO(stream.content), patch.hunks)
-            if content:
-                result.content = content
-                logger.info(f"successfully patched {patch}")
+        return None
+
+    @staticmethod
+    def _hunk_output(hunk, lines, pos, lead=0, trail=0):
+        """
+        Yield the output lines of ``hunk`` applied at source line index ``pos``,
+        leaving out ``lead`` and ``trail`` context lines ignored by fuzz.
+        """
+        ops = hunk.ops
+        stop = len(ops)
+        while trail:
+            stop -= 1
+            if ops[stop] != BACKSLASH:
+                trail -= 1
+
+        previous = None
+        for index in range(lead, stop):
+            op = ops[index]
+            if op == BACKSLASH:
+                # "\\ No newline at end of file" applies to the preceding line
+                if previous is not None and previous.endswith("\n"):
+                    previous = previous[:-1]
+                continue
+
+            if previous is not None:
+                yield previous
+                previous = None
+
+            if op == SPACE:
+                previous = lines[pos]
+                pos += 1
+            elif op == MINUS:
+                pos += 1
             else:
-                result.error(f"error patching file {patch}")
+                previous = hunk.line(index)
 
-        return result
+        if previous is not None:
+            yield previous
 
     def _reverse(self):
         """ reverse patch direction (this doesn't touch file_names) """
@@ -646,11 +1061,7 @@ class PatchSet:
             for h in p.hunks:
                 h.start_src, h.start_tgt = h.start_tgt, h.start_src
                 h.lines_src, h.lines_tgt = h.lines_tgt, h.lines_src
-                for i, line in enumerate(h.text):
-                    if line[0] == '+':
-                        h.text[i] = '-' + line[1:]
-                    elif line[0] == '-':
-                        h.text[i] = '+' + line[1:]
+                h.reverse()
 
     def revert(self):
         """ apply patch in reverse order """
@@ -743,6 +1154,351 @@ class PatchSet:
         return False
 
 
+class MyersMatcher(difflib.SequenceMatcher):
+    """
+    SequenceMatcher whose matching blocks come from Myers' O(ND) diff, which
+    stays fast on long sequences with many repeated lines where difflib's
+    longest-match recursion goes quadratic. Lines are interned to integers
+    first, and lines that occur on only one side are dropped before diffing
+    since they can never match. Ranges needing more than ``max_edits`` edits
+    are given up on and reported as entirely changed, bounding the quadratic
+    worst case much as difflib's autojunk heuristic does.
+    """
+
+    max_edits = 1000
+
+    def __init__(self, isjunk=None, a='', b='', autojunk=False):
+        super().__init__(isjunk, a, b, autojunk=False)
+
+    def set_seq2(self, b):
+        # difflib indexes b here for find_longest_match, which is never used
+        self.b = b
+        self.matching_blocks = self.opcodes = None
+        self.fullbcount = None
+
+    def get_matching_blocks(self):
+        if self.matching_blocks is not None:
+            return self.matching_blocks
+
+        ids = {}
+        a = [ids.setdefault(line, len(ids)) for line in self.a]
+        b = [ids.setdefault(line, len(ids)) for line in self.b]
+
+        # keep only lines present on both sides, remembering their positions
+        in_a, in_b = set(a), set(b)
+        apos = [i for i, line in enumerate(a) if line in in_b]
+        bpos = [j for j, line in enumerate(b) if line in in_a]
+        a = [a[i] for i in apos]
+        b = [b[j] for j in bpos]
+
+        blocks = []
+        for i, j, size in self._blocks(a, b):
+            for i, j in zip(apos[i:i + size], bpos[j:j + size]):
+                last = blocks[-1] if blocks else None
+                if last and last[0] + last[2] == i and last[1] + last[2] == j:
+                    last[2] += 1
+                else:
+                    blocks.append([i, j, 1])
+
+        blocks.append([len(self.a), len(self.b), 0])
+        self.matching_blocks = [difflib.Match(*block) for block in blocks]
+        return self.matching_blocks
+
+    def _blocks(self, a, b):
+        """Return the matching (i, j, size) blocks of ``a`` and ``b``."""
+        return self._myers(a, b, 0, len(a), 0, len(b))
+
+    def _myers(self, a, b, alo, ahi, blo, bhi):
+        """Return the matching blocks of ``a[alo:ahi]`` and ``b[blo:bhi]``."""
+        prefix = 0
+        while alo + prefix < ahi and blo + prefix < bhi and a[alo + prefix] == b[blo + prefix]:
+            prefix += 1
+
+        suffix = 0
+        while (
+            alo + prefix < ahi - suffix and blo + prefix < bhi - suffix and
+            a[ahi - suffix - 1] == b[bhi - suffix - 1]
+        ):
+            suffix += 1
+
+        head = [(alo, blo, prefix)] if prefix else []
+        tail = [(ahi - suffix, bhi - suffix, suffix)] if suffix else []
+        alo, ahi, blo, bhi = alo + prefix, ahi - suffix, blo + prefix, bhi - suffix
+        n, m = ahi - alo, bhi - blo
+        if not n or not m:
+            return head + tail
+
+        # Greedy forward search; v[offset + k] is the furthest x on diagonal k.
+        # Each round's v is kept (just the diagonals it can reach) to walk back.
+        offset = n + m + 1
+        v = [0] * (2 * offset + 1)
+        trace = []
+        for d in range(n + m + 1):
+            if d > self.max_edits:
+                return head + tail
+
+            trace.append(v[offset - d:offset + d + 1])
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                    x = v[offset + k + 1]
+                else:
+                    x = v[offset + k - 1] + 1
+
+                y = x - k
+                while x < n and y < m and a[alo + x] == b[blo + y]:
+                    x += 1
+                    y += 1
+
+                v[offset + k] = x
+                if x >= n and y >= m:
+                    break
+            else:
+                continue
+            break
+
+        blocks = []
+        x, y = n, m
+        for d in range(len(trace) - 1, -1, -1):
+            k = x - y
+            if d == 0:
+                start_x = start_y = 0
+            else:
+                previous = trace[d]
+                if k == -d or (k != d and previous[k - 1 + d] < previous[k + 1 + d]):
+                    prev_k = k + 1
+                    prev_x = previous[prev_k + d]
+                    start_x, start_y = prev_x, prev_x - prev_k + 1
+                else:
+                    prev_k = k - 1
+                    prev_x = previous[prev_k + d]
+                    start_x, start_y = prev_x + 1, prev_x - prev_k
+
+            if x > start_x:
+                blocks.append((alo + start_x, blo + start_y, x - start_x))
+
+            if d:
+                x, y = prev_x, prev_x - prev_k
+
+        blocks.reverse()
+        return head + blocks + tail
+
+
+class PatienceMatcher(MyersMatcher):
+    """
+    MyersMatcher that first anchors on lines occurring exactly once on both
+    sides, in the longest run of them appearing in the same order, and only
+    diffs the stretches between anchors with Myers. This keeps unrelated
+    repeated lines such as blank lines, table rules and code fences from
+    being matched across moved or rewritten sections.
+    """
+
+    def _blocks(self, a, b):
+        blocks = []
+        stack = [(0, len(a), 0, len(b))]
+        while stack:
+            item = stack.pop()
+            if len(item) == 3:
+                blocks.append(item)
+                continue
+
+            alo, ahi, blo, bhi = item
+            anchors = self._anchors(a, b, alo, ahi, blo, bhi)
+            if not anchors:
+                blocks.extend(self._myers(a, b, alo, ahi, blo, bhi))
+                continue
+
+            # the stretches between anchors, in order, pushed reversed to pop in
+            # order; stretches with nothing on one side cannot hold matches
+            items = []
+            for i, j in anchors:
+                if alo < i and blo < j:
+                    items.append((alo, i, blo, j))
+                items.append((i, j, 1))
+                alo, blo = i + 1, j + 1
+
+            if alo < ahi and blo < bhi:
+                items.append((alo, ahi, blo, bhi))
+            stack.extend(reversed(items))
+
+        return blocks
+
+    @staticmethod
+    def _anchors(a, b, alo, ahi, blo, bhi):
+        """
+        Return the (i, j) positions of the longest in-order run of lines that
+        occur exactly once in both ``a[alo:ahi]`` and ``b[blo:bhi]``.
+        """
+        unique_a, unique_b = {}, {}
+        for unique, seq, lo, hi in ((unique_a, a, alo, ahi), (unique_b, b, blo, bhi)):
+            for index in range(lo, hi):
+                line = seq[index]
+                unique[line] = None if line in unique else index
+
+        pairs = sorted(
+            (i, unique_b[line]) for line, i in unique_a.items()
+            if i is not None and unique_b.get(line) is not None
+        )
+
+        # patience sort on j; each pair links to the top of the pile to its left
+        tops, top_pairs, links = [], [], []
+        for index, (i, j) in enumerate(pairs):
+            pile = bisect_left(tops, j)
+            links.append(top_pairs[pile - 1] if pile else None)
+            if pile == len(tops):
+                tops.append(j)
+                top_pairs.append(index)
+            else:
+                tops[pile] = j
+                top_pairs[pile] = index
+
+        anchors = []
+        index = top_pairs[-1] if top_pairs else None
+        while index is not None:
+            anchors.append(pairs[index])
+            index = links[index]
+
+        anchors.reverse()
+        return anchors
+
+
+DIFF_ALGORITHMS = {
+    'difflib': difflib.SequenceMatcher,
+    'myers': MyersMatcher,
+    'patience': PatienceMatcher,
+}
+
+
+def _format_range(start, stop):
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+
+    return f'{start + 1 if length else start},{length}'
+
+
+def unified_diff(
+    a, b, fromfile='', tofile='', fromfiledate='', tofiledate='', n=3, lineterm='\n',
+    algorithm='difflib'
+):
+    """
+    ``difflib.unified_diff`` with a choice of line matching ``algorithm``, one
+    of the ``DIFF_ALGORITHMS``. The output format is the same for all of them;
+    only which lines are paired up as unchanged may differ.
+    """
+    matcher = DIFF_ALGORITHMS[algorithm](None, a, b)
+    started = False
+    for group in matcher.get_grouped_opcodes(n):
+        if not started:
+            started = True
+            fromdate = f'\t{fromfiledate}' if fromfiledate else ''
+            todate = f'\t{tofiledate}' if tofiledate else ''
+            yield f'--- {fromfile}{fromdate}{lineterm}'
+            yield f'+++ {tofile}{todate}{lineterm}'
+
+        first, last = group[0], group[-1]
+        source = _format_range(first[1], last[2])
+        target = _format_range(first[3], last[4])
+        yield f'@@ -{source} +{target} @@{lineterm}'
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
+
+
+re_word = re.compile(r'\s+|\w+|[^\w\s]')
+
+
+class DiffHunks(Sequence):
+    """
+    The hunks of the diff from lines ``a`` to lines ``b``, each built on access
+    as a dict of its unified ``header``, ``source`` and ``target`` ranges (as
+    ``[start, length]``) and ``lines``, so that a page of hunks can be sliced
+    out of a long diff without formatting the rest. Lines are ``{'op', 'text'}``
+    dicts; with ``words``, changed lines paired with a similar replacement
+    also get ``words``, their ``[op, text]`` segments where ``op`` is ``=``
+    for unchanged text or the line's own ``-`` or ``+``.
+    """
+
+    min_word_ratio = 0.5
+
+    def __init__(self, a, b, context=3, algorithm='difflib', words=False):
+        self.a = a
+        self.b = b
+        self.words = words
+        self.groups = list(DIFF_ALGORITHMS[algorithm](None, a, b).get_grouped_opcodes(context))
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.hunk(group) for group in self.groups[index]]
+
+        return self.hunk(self.groups[index])
+
+    def hunk(self, group):
+        first, last = group[0], group[-1]
+        source = _format_range(first[1], last[2])
+        target = _format_range(first[3], last[4])
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                lines.extend({'op': ' ', 'text': line} for line in self.a[i1:i2])
+                continue
+
+            removed = [{'op': '-', 'text': line} for line in self.a[i1:i2]]
+            added = [{'op': '+', 'text': line} for line in self.b[j1:j2]]
+            if self.words:
+                for old, new in zip(removed, added):
+                    self.word_diff(old, new)
+
+            lines.extend(removed)
+            lines.extend(added)
+
+        return {
+            'header': f'@@ -{source} +{target} @@',
+            'source': [first[1] + 1, last[2] - first[1]],
+            'target': [first[3] + 1, last[4] - first[3]],
+            'lines': lines,
+        }
+
+    def word_diff(self, old, new):
+        """Add ``words`` segments to a removed and added line pair if similar enough."""
+        a, b = re_word.findall(old['text']), re_word.findall(new['text'])
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        if matcher.ratio() < self.min_word_ratio:
+            return
+
+        old['words'], new['words'] = [], []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                self._segment(old['words'], '=', a[i1:i2])
+                self._segment(new['words'], '=', b[j1:j2])
+            else:
+                self._segment(old['words'], '-', a[i1:i2])
+                self._segment(new['words'], '+', b[j1:j2])
+
+    @staticmethod
+    def _segment(segments, op, tokens):
+        if not tokens:
+            return
+
+        if segments and segments[-1][0] == op:
+            segments[-1][1] += ''.join(tokens)
+        else:
+            segments.append([op, ''.join(tokens)])
+
+
 class DiffPatch:
 
     @classmethod
@@ -766,8 +1522,12 @@ class DiffPatch:
         their_content, our_content,
         their_filename='theirfile', our_filename='ourfile',
         their_ts=None, our_ts=None,
-        context=3
+        context=3, algorithm='difflib'
     ):
+        """
+        Return the unified diff from ``their_content`` to ``our_content``, with
+        lines matched by ``algorithm``: ``difflib``, ``myers`` or ``patience``.
+        """
         ts = datetime.now(timezone.utc).astimezone().isoformat()
         their_ts = str(their_ts or ts)
         our_ts = str(our_ts or ts)
@@ -778,11 +1538,11 @@ class DiffPatch:
         if isinstance(our_content, str):
             our_content = our_content.splitlines()
 
-        diff = difflib.unified_diff(
+        diff = unified_diff(
             their_content, our_content,
             str(their_filename), str(our_filename),
             their_ts, our_ts,
-            n=3
+            n=context, algorithm=algorithm
         )
         lines = list(line.rstrip('\n') for line in diff)
         return '\n'.join(lines)
@@ -795,6 +1555,77 @@ class DiffPatch:
 
         return PatchResult(their_content)
 
+    @staticmethod
+    def _sync_regions(base, ours, theirs):
+        """
+        Yield the regions where ``base`` lines match both ``ours`` and ``theirs``
+        as (base_start, base_end, ours_start, ours_end, theirs_start, theirs_end),
+        ending with an empty region at the end of all three.
+        """
+        ours_blocks = difflib.SequenceMatcher(None, base, ours, autojunk=False)
+        theirs_blocks = difflib.SequenceMatcher(None, base, theirs, autojunk=False)
+        ours_blocks = ours_blocks.get_matching_blocks()
+        theirs_blocks = theirs_blocks.get_matching_blocks()
+        i = j = 0
+        while i < len(ours_blocks) and j < len(theirs_blocks):
+            obase, omatch, olen = ours_blocks[i]
+            tbase, tmatch, tlen = theirs_blocks[j]
+            start, end = max(obase, tbase), min(obase + olen, tbase + tlen)
+            if start < end:
+                ours_start = omatch + start - obase
+                theirs_start = tmatch + start - tbase
+                yield (
+                    start, end,
+                    ours_start, ours_start + end - start,
+                    theirs_start, theirs_start + end - start
+                )
+
+            if obase + olen < tbase + tlen:
+                i += 1
+            else:
+                j += 1
+
+        yield len(base), len(base), len(ours), len(ours), len(theirs), len(theirs)
+
+    @classmethod
+    def merge(cls, base, ours, theirs, labels=('ours', 'theirs')):
+        """
+        Three-way line merge of ``ours`` and ``theirs``, both derived from
+        ``base``. Changes made on only one side, or identically on both, are
+        merged; overlapping changes are left in the content between conflict
+        markers and reported as errors of the returned PatchResult. Lines are
+        compared without their line endings; unchanged lines are taken from
+        ``ours``.
+        """
+        ours_lines, theirs_lines = ours.splitlines(keepends=True), theirs.splitlines(keepends=True)
+        base, ours, theirs = (text.splitlines() for text in (base, ours, theirs))
+        result = PatchResult()
+        lines = []
+        b = o = t = 0
+        for bstart, bend, ostart, oend, tstart, tend in cls._sync_regions(base, ours, theirs):
+            base_chunk, ours_chunk, theirs_chunk = base[b:bstart], ours[o:ostart], theirs[t:tstart]
+            if ours_chunk == theirs_chunk or theirs_chunk == base_chunk:
+                lines.extend(ours_lines[o:ostart])
+            elif ours_chunk == base_chunk:
+                lines.extend(theirs_lines[t:tstart])
+            else:
+                result.error(f'conflict at line {len(lines) + 1}')
+                lines.append(f'<<<<<<< {labels[0]}\n')
+                lines.extend(cls._terminated(ours_lines[o:ostart]))
+                lines.append('=======\n')
+                lines.extend(cls._terminated(theirs_lines[t:tstart]))
+                lines.append(f'>>>>>>> {labels[1]}\n')
+
+            lines.extend(ours_lines[ostart:oend])
+            b, o, t = bend, oend, tend
+
+        result.content = ''.join(lines)
+        return result
+
+    @staticmethod
+    def _terminated(lines):
+        return [line if line.endswith('\n') else line + '\n' for line in lines]
+
 
 fromstring = PatchSet.fromstring
 fromfile = PatchSet.fromfile
@@ -809,9 +1640,16 @@ def main():
     parser.add_argument('-v', type=int, dest='verbosity', default=0, help='be verbose')
     parser.add_argument('--diffstat', action='store_true', dest='diffstat',
         help='print diffstat and exit')
+    parser.add_argument('--format', choices=('text', 'json'), default='text',
+        help='diffstat output format')
     parser.add_argument('--revert', action='store_true',
         help='apply patch in reverse order (unpatch)')
     parser.add_argument('-d', '--diffpatch', action='store_true')
+    parser.add_argument('-F', '--fuzz', type=int, default=0,
+        help='number of context lines that may be ignored to find a hunk')
+    parser.add_argument('--root', help='apply every patch to the files under this directory')
+    parser.add_argument('-p', '--strip', type=int, default=None,
+        help='strip this many leading path components from patch filenames (with --root)')
     parser.add_argument('--pdb', action='store_true')
 
     args = parser.parse_args()
@@ -844,16 +1682,16 @@ def main():
                 logger.error('patch file does not exist - %s' % patchfile)
                 sys.exit(1)
 
-            ps = PatchSet.fromfile(patchfile)
-
             if args.diffstat:
-                fn = ps.diffstat
-            elif args.revert:
-                fn = ps.revert
+                res = PatchSet().diffstat(PatchSet.iterfile(patchfile), format=args.format)
             else:
-                fn = ps.apply_file
-
-            res = fn(*args.files)
+                ps = PatchSet.fromfile(patchfile)
+                ps.fuzz = args.fuzz
+                if args.root:
+                    res = ps.apply_all(args.root, strip=args.strip)
+                else:
+                    fn = ps.revert if args.revert else ps.apply_file
+                    res = fn(*args.files)
 
         if bool(res):
             print(res)
@@ -1,8 +1,10 @@
 from django import forms
 from django.contrib import messages
 from django.forms.models import modelformset_factory
+from django.utils.dateparse import parse_datetime
 
 from . import models
+from .diffpatch import DiffPatch
 
 
 class TagForm(forms.ModelForm):
@@ -28,6 +30,52 @@ class MarkdownPageForm(forms.ModelForm):
         self.mdp_type = kwargs.pop('mdp_type')
         initial['timestamp'] = instance.updated.isoformat() if instance else 'N/A'
         super().__init__(initial=initial, instance=instance, **kwargs)
+        self.merged = False
+
+    def clean(self):
+        """
+        If the page was saved by someone else since this edit began, three-way
+        merge this edit with theirs, using the archived revision the edit
+        started from as the base. Conflicts are put back in the form, between
+        conflict markers, for the editor to resolve and resubmit.
+        """
+        cleaned_data = super().clean()
+        text = cleaned_data.get('text')
+        if not self.instance.pk or text is None:
+            return cleaned_data
+
+        updated, current = models.MarkdownPage.objects.values_list(
+            'updated', 'text'
+        ).get(pk=self.instance.pk)
+        timestamp = cleaned_data.get('timestamp')
+        if timestamp == updated.isoformat():
+            return cleaned_data
+
+        started = parse_datetime(timestamp or '')
+        base = started and self.instance.markdownpagearchive_set.filter(created=started).first()
+        if not base:
+            self.resubmit(text, updated)
+            raise forms.ValidationError(
+                'This page was changed while you were editing it and your changes '
+                'could not be merged. Saving again will replace those changes.'
+            )
+
+        result = DiffPatch.merge(base.full_text, text, current, labels=('yours', 'current'))
+        if not result:
+            self.resubmit(result.content, updated)
+            raise forms.ValidationError(
+                'This page was changed while you were editing it. Your changes '
+                'conflict with theirs; resolve the marked sections and save again.'
+            )
+
+        cleaned_data['text'] = result.content
+        self.merged = True
+        return cleaned_data
+
+    def resubmit(self, text, updated):
+        self.data = self.data.copy()
+        self.data['text'] = text
+        self.data['timestamp'] = updated.isoformat()
 
     def save(self):
         if not self.has_changed():
@@ -38,6 +86,8 @@ class MarkdownPageForm(forms.ModelForm):
                 instance.type = self.mdp_type
             instance.save(user=self.request.user)
             self.save_m2m()
+            if self.merged:
+                messages.info(self.request, 'Your changes were merged with a concurrent edit')
             messages.success(self.request, 'Page saved')
 
         return self.instance
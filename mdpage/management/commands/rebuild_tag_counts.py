@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mdpage.models import MarkdownPageType, TagCount
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per page type tag counts from the tagged pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', help='Only pages of this page type prefix')
+
+    def handle(self, *args, **options):
+        types = None
+        prefix = options['prefix']
+        if prefix is not None:
+            types = list(MarkdownPageType.objects.filter(prefix=prefix))
+            if not types:
+                raise CommandError(f'No page type with prefix: {prefix}')
+
+        TagCount.objects.rebuild(types)
+        counts = TagCount.objects.all()
+        if types is not None:
+            counts = counts.filter(type__in=types)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {counts.count()} tag counts'))
@@ -0,0 +1,108 @@
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from mdpage.models import MarkdownPage, MarkdownPageType
+from mdpage.utils import mdpage_markdown_blocks
+
+
+def render_page(args):
+    pk, text, prefix = args
+    page = MarkdownPage(pk=pk, type=MarkdownPageType(prefix=prefix))
+    page.html, page.html_blocks = mdpage_markdown_blocks(text, page.type)
+    page.compress_html()
+    return page
+
+
+class Command(BaseCommand):
+    help = 'Re-render the stored HTML of markdown pages, without archiving them.'
+    fields = ['html', 'html_blocks', 'html_gzip', 'html_br']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', help='Only pages of this page type prefix')
+        parser.add_argument('--since', help='Only pages updated on or after this date/time')
+        parser.add_argument('--dry-run', action='store_true', help='Render but do not save')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Size of the process pool (default: CPU count, 0 renders in-process)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def get_since(self, value):
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = timezone.datetime.combine(date, timezone.datetime.min.time())
+
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+
+        return since
+
+    def get_queryset(self, prefix=None, since=None):
+        pages = MarkdownPage.objects.order_by('pk')
+        if prefix is not None:
+            pages = pages.filter(type__prefix=prefix)
+
+        if since:
+            pages = pages.filter(updated__gte=self.get_since(since))
+
+        return pages.values_list('pk', 'text', 'type__prefix')
+
+    def chunks(self, rows, size):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def handle(self, *args, **options):
+        pages = self.get_queryset(options['prefix'], options['since'])
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        dry_run = options['dry_run']
+
+        executor = None
+        render = map
+        if workers != 0:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+            render = partial(executor.map, chunksize=32)
+
+        count = 0
+        start = time.monotonic()
+        try:
+            for chunk in self.chunks(pages.iterator(chunk_size=chunk_size), chunk_size):
+                updates = list(render(render_page, chunk))
+
+                if not dry_run:
+                    MarkdownPage.objects.bulk_update(updates, self.fields)
+
+                count += len(updates)
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f'{count} pages rendered, {count / elapsed if elapsed else 0:.1f} pages/s'
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            '{} {} pages in {:.1f}s'.format(
+                'Rendered (dry run)' if dry_run else 'Re-rendered',
+                count,
+                time.monotonic() - start
+            )
+        ))
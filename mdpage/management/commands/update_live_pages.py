@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mdpage.models import update_live, next_boundary
+
+
+class Command(BaseCommand):
+    help = 'Update the live flag of pages whose publication window opened or closed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, waking at each publication window boundary'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60,
+            help='With --loop, the most seconds to wait between runs (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            changed = update_live()
+            if changed or not options['loop']:
+                self.stdout.write(f'{changed} pages went live or ended')
+
+            if not options['loop']:
+                break
+
+            delay = options['interval']
+            boundary = next_boundary()
+            if boundary is not None:
+                delay = max(0, min(delay, (boundary - timezone.now()).total_seconds()))
+
+            time.sleep(delay)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0002_auto_20200121_0938'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='markdownpage',
+            name='html_blocks',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0003_markdownpage_html_blocks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='markdownpage',
+            name='html_br',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='markdownpage',
+            name='html_gzip',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations, transaction, OperationalError
+
+from mdpage.search import (
+    FTS_TABLE,
+    PostgresSearchBackend,
+    create_fts_triggers,
+    drop_fts_triggers,
+)
+
+SEARCH_INDEX = 'mdpage_page_search'
+SQLITE_FTS = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "title, text, content='mdpage_markdownpage', content_rowid='id')"
+)
+
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from mdpage.conf import get_settings
+    config = get_settings()['search_config']
+    return GinIndex(PostgresSearchBackend.search_vector(config), name=SEARCH_INDEX)
+
+
+def create_search_index(apps, schema_editor):
+    MarkdownPage = apps.get_model('mdpage', 'MarkdownPage')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(MarkdownPage, search_index())
+    elif vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute(SQLITE_FTS)
+        except OperationalError:
+            # SQLite built without FTS5, searches fall back to LikeSearchBackend
+            return
+
+        create_fts_triggers(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    MarkdownPage = apps.get_model('mdpage', 'MarkdownPage')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(MarkdownPage, search_index())
+    elif vendor == 'sqlite':
+        drop_fts_triggers(schema_editor)
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0004_markdownpage_compressed_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='markdownpagearchive',
+            name='delta_run',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
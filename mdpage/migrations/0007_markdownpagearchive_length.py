@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+import re
+
+from django.db import migrations, models
+
+re_hunk = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+\d+(?:,(\d+))? @@')
+
+
+def apply_delta(delta, newer):
+    """
+    Frozen copy of ``mdpage.models.apply_delta`` as of this migration: apply the
+    reverse unified diff ``delta`` to ``newer``, both split on ``\\n`` only,
+    returning the older text or None if it does not apply.
+    """
+    if delta == '\n':
+        return newer
+
+    source = newer.split('\n')
+    lines = delta.split('\n')
+    result = []
+    position = 0
+    i = 0
+    while i < len(lines):
+        match = re_hunk.match(lines[i])
+        i += 1
+        if not match:
+            continue
+
+        start, old, new = int(match[1]), int(match[2] or 1), int(match[3] or 1)
+        # an empty range starts after its line rather than at it
+        start = start - 1 if old else start
+        if start < position:
+            return None
+
+        result.extend(source[position:start])
+        position = start
+        while old or new:
+            if i >= len(lines):
+                return None
+
+            op, text = lines[i][:1], lines[i][1:]
+            i += 1
+            if op in ' -':
+                if position >= len(source) or source[position] != text:
+                    return None
+                position += 1
+                old -= 1
+
+            if op in ' +':
+                result.append(text)
+                new -= 1
+
+    result.extend(source[position:])
+    return '\n'.join(result)
+
+
+def backfill_length(apps, schema_editor):
+    MarkdownPageArchive = apps.get_model('mdpage', 'MarkdownPageArchive')
+    archives = MarkdownPageArchive.objects.order_by('page_id', '-pk').only(
+        'page_id', 'text', 'delta_run'
+    )
+    updates = []
+    page_id = text = None
+    for archive in archives.iterator():
+        if archive.page_id != page_id:
+            page_id, text = archive.page_id, None
+
+        if archive.delta_run == 0:
+            text = archive.text
+        elif text is not None:
+            text = apply_delta(archive.text, text)
+
+        if text is not None:
+            archive.length = len(text)
+            updates.append(archive)
+
+        if len(updates) >= 500:
+            MarkdownPageArchive.objects.bulk_update(updates, ['length'])
+            updates = []
+
+    MarkdownPageArchive.objects.bulk_update(updates, ['length'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0006_markdownpagearchive_delta_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='markdownpagearchive',
+            name='length',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_length, migrations.RunPython.noop),
+    ]
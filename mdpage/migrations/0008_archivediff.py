@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0007_markdownpagearchive_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveDiff',
+            fields=[
+                ('archive', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='mdpage.markdownpagearchive')),
+                ('updated', models.DateTimeField()),
+                ('algorithm', models.CharField(max_length=20)),
+                ('diff', models.TextField(blank=True)),
+            ],
+        ),
+    ]
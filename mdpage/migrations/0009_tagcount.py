@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:28
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_tags(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    MarkdownPage = apps.get_model('mdpage', 'MarkdownPage')
+    TagCount = apps.get_model('mdpage', 'TagCount')
+
+    content_type = ContentType.objects.filter(app_label='mdpage', model='markdownpage').first()
+    if content_type is None:
+        return
+
+    page_types = dict(MarkdownPage.objects.filter(status='PUB').values_list('pk', 'type_id'))
+    counts = Counter()
+    items = TaggedItem.objects.filter(content_type=content_type).values_list('object_id', 'tag_id')
+    for page_id, tag_id in items.iterator():
+        if page_id in page_types:
+            counts[page_types[page_id], tag_id] += 1
+
+    TagCount.objects.bulk_create([
+        TagCount(type_id=type_id, tag_id=tag_id, count=count)
+        for (type_id, tag_id), count in counts.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0008_archivediff'),
+        ('taggit', '0002_auto_20150616_2121'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='taggit.tag')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mdpage.markdownpagetype')),
+            ],
+            options={
+                'unique_together': {('type', 'tag')},
+            },
+        ),
+        migrations.RunPython(count_tags, migrations.RunPython.noop),
+    ]
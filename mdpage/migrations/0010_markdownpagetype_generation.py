@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0009_tagcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='markdownpagetype',
+            name='generation',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:32
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+from mdpage.search import create_fts_triggers
+
+
+def set_live(apps, schema_editor):
+    now = timezone.now()
+    live = (
+        (Q(end_date__isnull=True) | Q(end_date__gt=now)) &
+        (Q(pub_date__isnull=True) | Q(pub_date__lte=now)) &
+        Q(status='PUB')
+    )
+    for name in ('MarkdownPageType', 'MarkdownPage'):
+        apps.get_model('mdpage', name).objects.filter(live).update(is_live=True)
+
+    # tag counts now cover live pages rather than all published-status ones
+    MarkdownPage = apps.get_model('mdpage', 'MarkdownPage')
+    TagCount = apps.get_model('mdpage', 'TagCount')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    content_type = ContentType.objects.filter(app_label='mdpage', model='markdownpage').first()
+    TagCount.objects.all().delete()
+    if content_type is None:
+        return
+
+    live_pages = dict(MarkdownPage.objects.filter(is_live=True).values_list('pk', 'type_id'))
+    counts = {}
+    rows = TaggedItem.objects.filter(content_type=content_type).values_list('object_id', 'tag_id')
+    for page_id, tag_id in rows.iterator():
+        if page_id in live_pages:
+            key = live_pages[page_id], tag_id
+            counts[key] = counts.get(key, 0) + 1
+
+    TagCount.objects.bulk_create([
+        TagCount(type_id=type_id, tag_id=tag_id, count=count)
+        for (type_id, tag_id), count in counts.items()
+    ], batch_size=500)
+
+
+def restore_search_triggers(apps, schema_editor):
+    # adding or removing is_live remakes mdpage_markdownpage on SQLite,
+    # dropping the triggers that keep its full-text index up to date
+    create_fts_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mdpage', '0010_markdownpagetype_generation'),
+        ('taggit', '0002_auto_20150616_2121'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        # run last when migrating backwards, after is_live is removed
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='markdownpage',
+            name='is_live',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='markdownpagetype',
+            name='is_live',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(set_live, migrations.RunPython.noop),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,25 @@
 import os
-import operator
 import mimetypes
-from functools import reduce
 from functools import partialmethod
 
-from django.db import models
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models.functions import Length
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from taggit.managers import TaggableManager
 from taggit.models import Tag
 
-from .utils import slugify, mdpage_markdown
+from .utils import slugify, mdpage_markdown_blocks, gzip_html, brotli_html
+from .utils import accepted_encodings, accepts_encoding
 from .conf import get_settings
+from .search import get_search_backend
+from .diffpatch import DiffPatch
 
 Q = models.Q
 User = get_user_model()
@@ -21,25 +27,58 @@ User = get_user_model()
 
 class PublishedMixin:
 
-    def published(self, **kwargs):
-        now = timezone.now()
-        return super().filter(
+    def live(self, now=None):
+        """The condition for rows inside their publication window at ``now``."""
+        now = now or timezone.now()
+        return (
             (Q(end_date__isnull=True) | Q(end_date__gt=now)) &
-            (Q(pub_date__isnull=True) | Q(pub_date__lte=now)),
-            status=self.model.Status.PUBLISHED,
-            **kwargs
+            (Q(pub_date__isnull=True) | Q(pub_date__lte=now)) &
+            Q(status=self.model.Status.PUBLISHED)
         )
 
+    def published(self, **kwargs):
+        return super().filter(is_live=True, **kwargs)
+
     def unpublished(self, **kwargs):
-        now = timezone.now()
-        query = Q(status=self.model.Status.PENDING) | (
-            Q(status=self.model.Status.PUBLISHED) & (
-                Q(pub_date__isnull=False, pub_date__gte=now) |
-                Q(end_date__isnull=False, end_date__lte=now)
-            )
+        return super().filter(is_live=False, **kwargs).exclude(
+            status=self.model.Status.WITHDRAWN
         )
 
-        return super().filter(query, **kwargs)
+    def set_live(self, pks, is_live):
+        """
+        Set ``is_live`` on the rows ``pks`` that don't have it yet, returning
+        the pks of the rows changed. The rows are locked before they are read,
+        so of concurrent calls only one sees each row change, and it alone
+        moves the row's tag counts.
+        """
+        with transaction.atomic(using=self.db):
+            changed = list(self.select_for_update().filter(
+                pk__in=pks, is_live=not is_live
+            ).order_by().values_list('pk', flat=True))
+            if changed:
+                self.filter(pk__in=changed, is_live=not is_live).update(is_live=is_live)
+
+        return changed
+
+    def update_live(self, now=None):
+        """
+        Set ``is_live`` on the rows whose publication window has opened or
+        closed since it was last set, returning the pks of those that went live
+        and of those that ended.
+        """
+        live = self.live(now)
+        started = self.filter(live, is_live=False).values_list('pk', flat=True)
+        ended = self.filter(is_live=True).exclude(live).values_list('pk', flat=True)
+        return self.set_live(list(started), True), self.set_live(list(ended), False)
+
+    def next_boundary(self, now=None):
+        """The next ``pub_date`` or ``end_date`` after ``now`` of a published row, or None."""
+        now = now or timezone.now()
+        boundaries = self.filter(status=self.model.Status.PUBLISHED).aggregate(
+            pub_date=models.Min('pub_date', filter=Q(pub_date__gt=now)),
+            end_date=models.Min('end_date', filter=Q(end_date__gt=now)),
+        )
+        return min(filter(None, boundaries.values()), default=None)
 
 
 class PublishedQuerySet(PublishedMixin, models.QuerySet):
@@ -64,9 +103,17 @@ class MarkdownPageBase(models.Model):
         db_index=True
     )
 
+    # ``is_published`` as of the last save or run of ``update_live``, for
+    # ``published`` to filter on
+    is_live = models.BooleanField(default=False, db_index=True, editable=False)
+
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        self.is_live = self.is_published
+        super().save(*args, **kwargs)
+
     @property
     def available(self):
         return self.pub_date or self.updated
@@ -96,6 +143,10 @@ class MarkdownPageType(MarkdownPageBase):
     show_text = models.BooleanField(default=True)
     show_topics = models.BooleanField(default=True)
 
+    # bumped whenever the listing or topics of this type may change, to key
+    # their cached fragments
+    generation = models.PositiveIntegerField(default=0, editable=False)
+
     objects = PublishedQuerySet.as_manager()
 
     def __str__(self):
@@ -108,13 +159,24 @@ class MarkdownPageType(MarkdownPageBase):
     create_url = partialmethod(_reverse, 'create')
 
     def tags(self):
-        return Tag.objects.filter(
-            markdownpage__type=self
-        ).annotate(count=models.Count('name')).values('name', 'slug', 'count')
+        return self.tagcount_set.filter(count__gt=0).order_by('tag__name').values(
+            'count', name=models.F('tag__name'), slug=models.F('tag__slug')
+        )
 
     def tagged_by(self, tag):
         return self.markdownpage_set.filter(tags__name=tag)
 
+    @classmethod
+    def bump_generation(cls, pk):
+        cls.objects.filter(pk=pk).update(generation=models.F('generation') + 1)
+
+    def next_boundary(self):
+        """
+        The next time one of this type's published pages enters or leaves its
+        publication window, or None.
+        """
+        return MarkdownPage.objects.filter(type=self).next_boundary()
+
     @property
     def settings(self):
         return get_settings(self.prefix)
@@ -135,24 +197,8 @@ class PageQuerySetMixin(PublishedMixin):
         except self.model.DoesNotExist:
             return None
 
-    def search(self, text):
-        words = text.split()
-        criteria = []
-        for word in words:
-            criteria.extend([
-                models.Q(title__icontains=word),
-                models.Q(text__icontains=word)
-            ])
-
-        criteria = [
-            (models.Q(title__icontains=word) | models.Q(text__icontains=word))
-            for word in words
-        ]
-
-        if criteria:
-            return self.filter(reduce(operator.or_, criteria))
-
-        return self.none()
+    def search(self, text, mdp_type=None):
+        return get_search_backend(self.db).search(self, text, mdp_type)
 
 
 class PageQuerySet(PageQuerySetMixin, models.QuerySet):
@@ -166,6 +212,9 @@ class MarkdownPage(MarkdownPageBase):
     text = models.TextField(blank=True)
     summary = models.TextField(blank=True)
     html = models.TextField(blank=True)
+    html_blocks = models.JSONField(default=list, blank=True, editable=False)
+    html_gzip = models.BinaryField(null=True, blank=True, editable=False)
+    html_br = models.BinaryField(null=True, blank=True, editable=False)
 
     objects = PageQuerySet.as_manager()
     tags = TaggableManager(blank=True)
@@ -186,6 +235,7 @@ class MarkdownPage(MarkdownPageBase):
     text_url = partialmethod(_reverse, 'text')
     edit_url = partialmethod(_reverse, 'edit')
     upload_url = partialmethod(_reverse, 'upload')
+    fragment_url = partialmethod(_reverse, 'fragment')
 
     @property
     def session_key(self):
@@ -197,17 +247,54 @@ class MarkdownPage(MarkdownPageBase):
 
         archive = kwargs.pop('archive', True)
         user = kwargs.pop('user', None)
+        previous = None
+        if self.pk:
+            previous = MarkdownPage.objects.filter(pk=self.pk).values_list(
+                'type_id', 'is_live'
+            ).first()
+
         if self.pk and archive:
-            MarkdownPageArchive.objects.create(
-                page=self,
-                user_id=user.id if user else None,
-                **dict(MarkdownPage.objects.values('text').annotate(
-                    created=models.F('updated')
-                ).get(pk=self.pk))
-            )
+            MarkdownPageArchive.objects.archive(self, user)
+
+        if self.pk and self.type.get_setting('diff_cache_table'):
+            ArchiveDiff.objects.filter(archive__page_id=self.pk).delete()
 
-        self.html = mdpage_markdown(self.text, self.type)
+        self.html, self.html_blocks = mdpage_markdown_blocks(
+            self.text,
+            self.type,
+            self.html_blocks
+        )
+        self.compress_html()
         super().save(*args, **kwargs)
+        TagCount.objects.page_changed(self, previous)
+        MarkdownPageType.bump_generation(self.type_id)
+        if previous and previous[0] != self.type_id:
+            MarkdownPageType.bump_generation(previous[0])
+
+    def compress_html(self):
+        if self.type.get_setting('compress_html'):
+            self.html_gzip = gzip_html(self.html)
+            self.html_br = brotli_html(self.html)
+        else:
+            self.html_gzip = self.html_br = None
+
+    def compressed_html(self, accept_encoding):
+        """
+        Return a ``(content, encoding)`` pair for the best stored representation
+        of ``html`` acceptable to the ``Accept-Encoding`` header value.
+        """
+        codings = accepted_encodings(accept_encoding)
+        stored = [
+            (accepts_encoding(codings, encoding), encoding, content)
+            for encoding, content in (('br', self.html_br), ('gzip', self.html_gzip))
+            if content
+        ]
+        # the first, so br, of the codings with the highest q-value
+        q, encoding, content = max(stored, key=lambda item: item[0], default=(0, None, None))
+        if q > 0:
+            return bytes(content), encoding
+
+        return self.html.encode(), None
 
     @property
     def tags_str(self):
@@ -221,11 +308,70 @@ class MarkdownPage(MarkdownPageBase):
             return None
 
 
+def make_delta(newer, older, algorithm='difflib'):
+    """
+    Return a unified diff that turns ``newer`` into ``older``. Texts are split on
+    ``\\n`` only and given a trailing newline, so that line endings and a missing
+    final newline survive the round trip through ``apply_delta``.
+    """
+    return DiffPatch.diff(newer.split('\n'), older.split('\n'), algorithm=algorithm) + '\n'
+
+
+def apply_delta(delta, newer):
+    if delta == '\n':
+        return newer
+
+    result = DiffPatch.patch(delta, newer + '\n')
+    return str(result)[:-1] if result else None
+
+
+class ArchiveManager(models.Manager):
+
+    def archive(self, page, user=None):
+        """
+        Archive the currently stored text of ``page``. In delta mode the new
+        archive holds the full text and its predecessor is replaced by a reverse
+        delta against it, unless that would make a delta chain longer than the
+        ``archive_keyframe_interval`` setting, in which case it stays a keyframe.
+        """
+        archive = self.create(
+            page=page,
+            user_id=user.id if user else None,
+            **dict(MarkdownPage.objects.values('text').annotate(
+                created=models.F('updated'),
+                length=Length('text'),
+            ).get(pk=page.pk))
+        )
+
+        if page.type.get_setting('archive_deltas'):
+            older = list(self.filter(page=page, pk__lt=archive.pk).order_by('-pk')[:2])
+            if older and not older[0].is_delta:
+                previous = older[0]
+                delta_run = older[1].delta_run + 1 if len(older) > 1 else 1
+                if delta_run <= page.type.get_setting('archive_keyframe_interval'):
+                    delta = make_delta(
+                        archive.text, previous.text, page.type.get_setting('diff_algorithm')
+                    )
+                    if apply_delta(delta, archive.text) == previous.text:
+                        previous.text = delta
+                        previous.delta_run = delta_run
+                        previous.save(update_fields=['text', 'delta_run'])
+
+        return archive
+
+
 class MarkdownPageArchive(models.Model):
     page = models.ForeignKey(MarkdownPage, on_delete=models.CASCADE)
     created = models.DateTimeField()
     text = models.TextField(blank=True)
     user_id = models.IntegerField(blank=True, null=True)
+    length = models.PositiveIntegerField(default=0)
+
+    # 0 if ``text`` is the full text, otherwise ``text`` is a reverse delta against
+    # the next newer archive and this is the number of consecutive deltas ending here
+    delta_run = models.PositiveIntegerField(default=0)
+
+    objects = ArchiveManager()
 
     class Meta:
         ordering = ('-created', )
@@ -235,15 +381,224 @@ class MarkdownPageArchive(models.Model):
         return '{:%b %d, %y %H:%M %Z}'.format(self.created)
 
     @property
+    def is_delta(self):
+        return self.delta_run > 0
+
+    @cached_property
+    def full_text(self):
+        """The archived text, reconstructed from the nearest newer keyframe if needed."""
+        if not self.is_delta:
+            return self.text
+
+        newer = MarkdownPageArchive.objects.filter(page_id=self.page_id, pk__gt=self.pk)
+        keyframe = newer.filter(delta_run=0).order_by('pk').values_list('pk', 'text').first()
+        if keyframe is None:
+            raise ValueError(f'Archive {self.pk} has no keyframe')
+
+        keyframe_pk, text = keyframe
+        deltas = newer.filter(pk__lt=keyframe_pk).order_by('-pk').values_list('text', flat=True)
+        for delta in [*deltas, self.text]:
+            text = apply_delta(delta, text)
+            if text is None:
+                raise ValueError(f'Archive {self.pk} delta chain is corrupt')
+
+        return text
+
+    @cached_property
     def author(self):
         return User.objects.get(pk=self.user_id) if self.user_id else None
 
+    @classmethod
+    def set_authors(cls, archives):
+        """Fetch the authors of ``archives`` with a single query."""
+        users = User.objects.in_bulk({arc.user_id for arc in archives if arc.user_id})
+        for arc in archives:
+            arc.author = users.get(arc.user_id)
+
+        return archives
+
     def get_absolute_url(self):
         return reverse(f'{self.page.type.prefix}:history-version', kwargs={
             'slug': self.page.slug,
             'version': self.pk
         })
 
+    def diff(self, page):
+        """
+        Return the unified diff from this archive to the current text of ``page``.
+        Both are fixed for a given ``page.updated``, so the diff is cached on it,
+        in the ``diff_cache_alias`` cache and, with ``diff_cache_table`` set, in
+        ``ArchiveDiff`` rows, which page saves clear.
+        """
+        get_setting = page.type.get_setting
+        algorithm = get_setting('diff_algorithm')
+        alias = get_setting('diff_cache_alias')
+        cache = caches[alias] if alias else None
+        key = f'mdpage:diff:{self.pk}:{page.updated.timestamp()}:{algorithm}'
+        diff = cache.get(key) if cache else None
+        if diff is not None:
+            return diff
+
+        if get_setting('diff_cache_table'):
+            diff = ArchiveDiff.objects.filter(
+                archive=self,
+                updated=page.updated,
+                algorithm=algorithm,
+            ).values_list('diff', flat=True).first()
+
+        if diff is None:
+            diff = DiffPatch.diff(
+                self.full_text, page.text,
+                their_filename=f'archive-{self.pk}', our_filename='current',
+                their_ts=self.created, our_ts=page.updated,
+                context=3, algorithm=algorithm
+            )
+            if get_setting('diff_cache_table'):
+                ArchiveDiff.objects.update_or_create(archive=self, defaults={
+                    'updated': page.updated,
+                    'algorithm': algorithm,
+                    'diff': diff,
+                })
+
+        if cache:
+            cache.set(key, diff, get_setting('diff_cache_timeout'))
+
+        return diff
+
+
+class ArchiveDiff(models.Model):
+    """The diff from an archive to its page's text as of ``updated``."""
+    archive = models.OneToOneField(MarkdownPageArchive, on_delete=models.CASCADE, primary_key=True)
+    updated = models.DateTimeField()
+    algorithm = models.CharField(max_length=20)
+    diff = models.TextField(blank=True)
+
+
+class TagCountManager(models.Manager):
+
+    def adjust(self, type_id, tag_ids, delta):
+        tag_ids = list(tag_ids)
+        if not tag_ids:
+            return
+
+        with transaction.atomic(using=self.db):
+            self.bulk_create(
+                [TagCount(type_id=type_id, tag_id=tag_id) for tag_id in tag_ids],
+                ignore_conflicts=True
+            )
+            self.filter(type_id=type_id, tag_id__in=tag_ids).update(
+                count=models.F('count') + delta
+            )
+
+    def page_changed(self, page, previous):
+        """
+        Move the counts for ``page``'s tags if saving it changed whether it is
+        counted or under which type; ``previous`` is its stored ``(type_id,
+        is_live)`` before the save, or None for a new page.
+        """
+        before = previous[0] if previous and previous[1] else None
+        after = page.type_id if page.is_live else None
+        if before == after:
+            return
+
+        tag_ids = list(page.tags.values_list('pk', flat=True))
+        if before:
+            self.adjust(before, tag_ids, -1)
+
+        if after:
+            self.adjust(after, tag_ids, 1)
+
+    def rebuild(self, types=None):
+        """Recount the tags of published pages, of all types or only ``types``."""
+        pages = MarkdownPage.objects.filter(is_live=True, tags__isnull=False)
+        counts = self.all()
+        if types is not None:
+            pages = pages.filter(type__in=types)
+            counts = counts.filter(type__in=types)
+
+        rows = pages.values_list('type_id', 'tags').annotate(count=models.Count('pk'))
+        with transaction.atomic(using=self.db):
+            counts.delete()
+            self.bulk_create([
+                TagCount(type_id=type_id, tag_id=tag_id, count=count)
+                for type_id, tag_id, count in rows
+            ], batch_size=500)
+
+
+class TagCount(models.Model):
+    """
+    Number of published pages of a type with a tag, maintained as pages are
+    tagged, untagged, published and unpublished, for ``MarkdownPageType.tags``.
+    """
+    type = models.ForeignKey(MarkdownPageType, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    objects = TagCountManager()
+
+    class Meta:
+        unique_together = (('type', 'tag'), )
+
+    def __str__(self):
+        return f'{self.type}:{self.tag} ({self.count})'
+
+
+@receiver(m2m_changed, sender=MarkdownPage.tags.through)
+def count_page_tags(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, MarkdownPage):
+        return
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        MarkdownPageType.bump_generation(instance.type_id)
+
+    if not instance.is_live:
+        return
+
+    if action == 'post_add':
+        TagCount.objects.adjust(instance.type_id, pk_set, 1)
+    elif action == 'post_remove':
+        TagCount.objects.adjust(instance.type_id, pk_set, -1)
+    elif action == 'pre_clear':
+        TagCount.objects.adjust(instance.type_id, instance.tags.values_list('pk', flat=True), -1)
+
+
+@receiver(pre_delete, sender=MarkdownPage)
+def uncount_page_tags(sender, instance, **kwargs):
+    MarkdownPageType.bump_generation(instance.type_id)
+    if instance.is_live:
+        TagCount.objects.adjust(instance.type_id, instance.tags.values_list('pk', flat=True), -1)
+
+
+@transaction.atomic
+def update_live(now=None):
+    """
+    Bring ``is_live`` up to date for page types and pages whose publication
+    window opened or closed, moving their tag counts and bumping the
+    generation of their types. Returns the number of rows changed.
+    """
+    started, ended = MarkdownPageType.objects.update_live(now)
+    changed = len(started) + len(ended)
+    started, ended = MarkdownPage.objects.update_live(now)
+    type_ids = set()
+    for pks, delta in ((started, 1), (ended, -1)):
+        pages = MarkdownPage.objects.filter(pk__in=pks).only('type_id').prefetch_related('tags')
+        for page in pages:
+            TagCount.objects.adjust(page.type_id, [tag.pk for tag in page.tags.all()], delta)
+            type_ids.add(page.type_id)
+
+    for type_id in type_ids:
+        MarkdownPageType.bump_generation(type_id)
+
+    return changed + len(started) + len(ended)
+
+
+def next_boundary(now=None):
+    """The next time a page type or page enters or leaves its publication window."""
+    return min(filter(None, (
+        MarkdownPageType.objects.next_boundary(now),
+        MarkdownPage.objects.next_boundary(now),
+    )), default=None)
+
 
 def upload_static_content_to(instance, filename):
     typ, enc = mimetypes.guess_type(filename)
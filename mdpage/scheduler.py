@@ -0,0 +1,63 @@
+import logging
+import threading
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LiveScheduler:
+    """
+    In-process stand-in for a periodic ``update_live_pages`` run: a daemon
+    thread that updates ``is_live`` at each publication window boundary, and
+    at least every ``interval`` seconds to pick up boundaries saved since.
+    Meant for single-process deployments and development; elsewhere, run the
+    management command from cron or a task queue.
+    """
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self, **kwargs):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='mdpage-live', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.interval = None
+        self.wakeup.set()
+
+    def run(self):
+        while self.interval is not None:
+            delay = self.interval
+            try:
+                delay = self.run_once()
+            except Exception:
+                logger.exception('Updating live pages failed')
+            finally:
+                close_old_connections()
+
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+    def run_once(self):
+        """Update ``is_live`` and return the seconds until the next run is due."""
+        from .models import update_live, next_boundary
+
+        changed = update_live()
+        if changed:
+            logger.info('%d pages went live or ended', changed)
+
+        boundary = next_boundary()
+        if boundary is None:
+            return self.interval
+
+        return max(0, min(self.interval, (boundary - timezone.now()).total_seconds()))
+
+
+scheduler = LiveScheduler()
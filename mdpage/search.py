@@ -0,0 +1,364 @@
+import re
+import operator
+import threading
+from array import array
+from collections import defaultdict
+from functools import reduce, lru_cache
+
+from django.db import connections, models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .conf import get_settings
+
+FTS_TABLE = 'mdpage_markdownpage_fts'
+FTS_TRIGGERS = {
+    'ai': f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON mdpage_markdownpage BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END""",
+    'ad': f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON mdpage_markdownpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+    END""",
+    'au': f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, text ON mdpage_markdownpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END""",
+}
+
+
+def drop_fts_triggers(schema_editor):
+    for name in FTS_TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{name}')
+
+
+def create_fts_triggers(schema_editor):
+    """
+    (Re)create the triggers keeping the SQLite FTS5 table in sync with
+    ``mdpage_markdownpage`` and rebuild the index from it. Django remakes that
+    table for most schema changes on SQLite, which drops the triggers, so every
+    migration altering ``MarkdownPage`` must call this afterwards.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return
+
+    drop_fts_triggers(schema_editor)
+    for sql in FTS_TRIGGERS.values():
+        schema_editor.execute(sql)
+
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class SearchBackend:
+    """
+    Base search backend. ``search`` filters a ``MarkdownPage`` queryset, optionally
+    known to be limited to pages of ``mdp_type``, down to the pages matching any
+    of the words in ``text``, annotated with
+    ``search_rank`` (higher is better) and ``search_snippet`` (an HTML fragment
+    with matches wrapped in ``<mark>``) where the backend supports it.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def search(self, queryset, text, mdp_type=None):
+        raise NotImplementedError
+
+    @classmethod
+    def is_available(cls, connection):
+        return True
+
+
+class LikeSearchBackend(SearchBackend):
+    """Case-insensitive substring match on title and text."""
+
+    def search(self, queryset, text, mdp_type=None):
+        criteria = [
+            (models.Q(title__icontains=word) | models.Q(text__icontains=word))
+            for word in text.split()
+        ]
+
+        if criteria:
+            return queryset.filter(reduce(operator.or_, criteria))
+
+        return queryset.none()
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    PostgreSQL full-text search, served by the GIN expression index created in
+    migration 0005 for the configured ``search_config``.
+    """
+
+    @classmethod
+    def is_available(cls, connection):
+        return connection.vendor == 'postgresql'
+
+    @staticmethod
+    def search_vector(config):
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector('title', 'text', config=config)
+
+    def search(self, queryset, text, mdp_type=None):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+        words = text.split()
+        if not words:
+            return queryset.none()
+
+        config = get_settings()['search_config']
+        query = reduce(operator.or_, [
+            SearchQuery(word, config=config, search_type='plain') for word in words
+        ])
+        return queryset.annotate(
+            search_vector=self.search_vector(config),
+        ).filter(search_vector=query).annotate(
+            search_rank=SearchRank(models.F('search_vector'), query),
+            search_snippet=SearchHeadline(
+                'text',
+                query,
+                config=config,
+                start_sel='<mark>',
+                stop_sel='</mark>',
+                max_words=30,
+                min_words=10,
+            ),
+        ).order_by('-search_rank', 'title')
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 search against the external content table created in migration
+    0005, which triggers keep in sync with ``mdpage_markdownpage``.
+    """
+
+    @classmethod
+    def is_available(cls, connection):
+        return (
+            connection.vendor == 'sqlite' and
+            FTS_TABLE in connection.introspection.table_names()
+        )
+
+    @staticmethod
+    def match_expression(text):
+        return ' OR '.join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+    def search(self, queryset, text, mdp_type=None):
+        match = self.match_expression(text)
+        if not match:
+            return queryset.none()
+
+        # FTS5 auxiliary functions only work in a query that does the MATCH itself,
+        # so join the FTS table rather than annotating with subqueries. The unary
+        # + hides the rowid from the FTS table's index, so SQLite runs the MATCH
+        # once and looks up pages by pk, rather than running it again for every
+        # page matching the other filters, as it would for counts.
+        opts = queryset.model._meta
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'+{FTS_TABLE}.rowid = "{opts.db_table}"."{opts.pk.column}"',
+                f'{FTS_TABLE} MATCH %s'
+            ],
+            params=[match],
+            select={
+                # bm25() is lower for better matches; negate it so higher ranks first
+                'search_rank': f'-bm25({FTS_TABLE}, 10.0, 1.0)',
+                'search_snippet': f"snippet({FTS_TABLE}, 1, '<mark>', '</mark>', '&hellip;', 24)",
+            },
+        ).order_by('-search_rank', 'title')
+
+
+re_token = re.compile(r'\w+')
+re_phrase = re.compile(r'"([^"]+)"|(\S+)')
+re_sibilant_plural = re.compile(r'(?:ss|zz|x|ch|sh)es$')
+SUFFIXES = ('ingly', 'edly', 'ing', 'ed', 'ly')
+
+
+def stem(word):
+    """
+    Strip the most common English suffixes; good enough for matching inflections.
+    Plurals are reduced first, much as in step 1a of the Porter stemmer, so
+    that "processes" and "process" or "stories" and "story" agree.
+    """
+    if word.endswith('ies') and len(word) > 4:
+        word = word[:-3] + 'y'
+    elif re_sibilant_plural.search(word) and len(word) > 4:
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')) and len(word) > 3:
+        word = word[:-1]
+
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # running -> run, stopped -> stop
+            if word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            break
+
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in re_token.findall(text.lower())]
+
+
+class InvertedIndex:
+    """
+    Positional inverted index over the title and text of one page type's pages.
+    Each term maps to its postings, a ``{pk: array('I', positions)}`` dict.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = defaultdict(dict)
+        self.terms = {}
+
+    def add(self, pk, title, text):
+        positions = defaultdict(lambda: array('I'))
+        for position, term in enumerate(tokenize(f'{title}\n{text}')):
+            positions[term].append(position)
+
+        with self.lock:
+            self._remove(pk)
+            for term, found in positions.items():
+                self.postings[term][pk] = found
+
+            self.terms[pk] = tuple(positions)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        for term in self.terms.pop(pk, ()):
+            postings = self.postings[term]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[term]
+
+    def phrase(self, terms):
+        """Return the set of pks containing ``terms`` at consecutive positions."""
+        postings = [self.postings.get(term, {}) for term in terms]
+        if not all(postings):
+            return set()
+
+        pks = set.intersection(*(set(p) for p in postings))
+        if len(terms) == 1:
+            return pks
+
+        return {
+            pk for pk in pks
+            if set(postings[0][pk]).intersection(*(
+                {pos - offset for pos in p[pk]} for offset, p in enumerate(postings[1:], 1)
+            ))
+        }
+
+    def search(self, text):
+        """Return the set of pks matching any word or quoted phrase of ``text``."""
+        pks = set()
+        with self.lock:
+            for phrase, word in re_phrase.findall(text):
+                terms = tokenize(phrase or word)
+                if terms:
+                    pks |= self.phrase(terms)
+
+        return pks
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    In-process inverted index search, for databases without full-text search.
+    Indexes are built lazily per page type and kept current from this process's
+    save and delete signals; pages changed by other processes or by queryset
+    updates are only seen after ``reset``.
+    """
+
+    def __init__(self, alias='default'):
+        super().__init__(alias)
+        self.lock = threading.Lock()
+        self.indexes = {}
+
+    def get_index(self, type_id):
+        with self.lock:
+            index = self.indexes.get(type_id)
+            if index is None:
+                index = self.indexes[type_id] = self.build_index(type_id)
+
+        return index
+
+    def build_index(self, type_id):
+        from .models import MarkdownPage
+
+        index = InvertedIndex()
+        pages = MarkdownPage.objects.using(self.alias).filter(type_id=type_id)
+        for pk, title, text in pages.values_list('pk', 'title', 'text').iterator():
+            index.add(pk, title, text)
+
+        return index
+
+    def reset(self):
+        with self.lock:
+            self.indexes.clear()
+
+    def page_saved(self, page):
+        index = self.indexes.get(page.type_id)
+        if index is not None:
+            index.add(page.pk, page.title, page.text)
+
+    def page_deleted(self, page):
+        index = self.indexes.get(page.type_id)
+        if index is not None:
+            index.remove(page.pk)
+
+    def search(self, queryset, text, mdp_type=None):
+        from .models import MarkdownPageType
+
+        if mdp_type is None:
+            type_ids = MarkdownPageType.objects.using(self.alias).values_list('pk', flat=True)
+        else:
+            type_ids = [mdp_type.pk]
+
+        pks = set()
+        for type_id in type_ids:
+            pks |= self.get_index(type_id).search(text)
+
+        return queryset.filter(pk__in=pks) if pks else queryset.none()
+
+
+@receiver(post_save, sender='mdpage.MarkdownPage')
+def index_page(sender, instance, using, **kwargs):
+    backend = get_search_backend(using)
+    if isinstance(backend, InvertedIndexSearchBackend):
+        backend.page_saved(instance)
+
+
+@receiver(post_delete, sender='mdpage.MarkdownPage')
+def unindex_page(sender, instance, using, **kwargs):
+    backend = get_search_backend(using)
+    if isinstance(backend, InvertedIndexSearchBackend):
+        backend.page_deleted(instance)
+
+
+BACKENDS = [PostgresSearchBackend, SQLiteSearchBackend]
+
+
+@lru_cache(maxsize=None)
+def get_search_backend(alias='default'):
+    """
+    Return the search backend for the database ``alias``: the ``search_backend``
+    setting if given as a dotted path, otherwise the best available one.
+    """
+    backend = get_settings()['search_backend']
+    if backend:
+        return import_string(backend)(alias)
+
+    connection = connections[alias]
+    for cls in BACKENDS:
+        if cls.is_available(connection):
+            return cls(alias)
+
+    return LikeSearchBackend(alias)
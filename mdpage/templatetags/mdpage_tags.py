@@ -1,5 +1,9 @@
+import hashlib
+
 from django import template
+from django.core.cache import caches
 from django.template import loader
+from django.utils import timezone
 from mdpage import utils
 
 register = template.Library()
@@ -33,3 +37,67 @@ def select_template(mdp_type, tmpl_part):
     return loader.select_template(
         utils.get_mdp_type_template_list(tmpl_part, mdp_type)
     )
+
+
+class FragmentCacheNode(template.Node):
+    """
+    Cache the rendered contents under the page type's generation, so that they
+    are replaced once a page of that type changes, and at most until the next
+    publication window boundary of its pages.
+    """
+
+    def __init__(self, nodelist, mdp_type, name, key):
+        self.nodelist = nodelist
+        self.mdp_type = mdp_type
+        self.name = name
+        self.key = key
+
+    def render(self, context):
+        mdp_type = self.mdp_type.resolve(context)
+        key = self.key.resolve(context) if self.key else ''
+        alias = mdp_type.get_setting('fragment_cache_alias')
+        if not alias or key is None:
+            return self.nodelist.render(context)
+
+        cache = caches[alias]
+        key = 'mdpage:fragment:{}:{}:{}:{}'.format(
+            mdp_type.pk,
+            mdp_type.generation,
+            self.name.resolve(context),
+            hashlib.sha1(str(key).encode()).hexdigest()
+        )
+        content = cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            timeout = mdp_type.get_setting('fragment_cache_timeout')
+            boundary = mdp_type.next_boundary()
+            if boundary:
+                remaining = int((boundary - timezone.now()).total_seconds())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+
+            if timeout is None or timeout > 0:
+                cache.set(key, content, timeout)
+
+        return content
+
+
+@register.tag(name='mdpage_cache')
+def do_mdpage_cache(parser, token):
+    """
+    {% mdpage_cache mdp_type name [key] %} ... {% endmdpage_cache %}
+
+    Cache the contents per ``mdp_type``, ``name`` and ``key`` in the type's
+    ``fragment_cache_alias`` cache; a ``key`` of None disables caching.
+    """
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes two or three arguments")
+
+    nodelist = parser.parse(('endmdpage_cache',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        parser.compile_filter(bits[3]) if len(bits) == 4 else None,
+    )
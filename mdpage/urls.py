@@ -8,6 +8,7 @@ page_patterns = [
     # read perm required
     path('', views.PageView.as_view(), name='view'),
     path('text/', views.PageView.as_view(as_text=True), name='text'),
+    path('fragment/', views.PageFragmentView.as_view(), name='fragment'),
 
     # write perm required
     path('edit/', views.PageEditView.as_view(), name='edit'),
@@ -16,6 +17,12 @@ page_patterns = [
     # extras perm required
     path('history/', views.PageHistoryView.as_view(), name='history'),
     path('history/<int:version>/', views.PageHistoryView.as_view(), name='history-version'),
+    path('history/<int:a>..<int:b>/', views.PageCompareView.as_view(), name='history-compare'),
+    path(
+        'history/<int:a>..current/',
+        views.PageCompareView.as_view(),
+        name='history-compare-current'
+    ),
 ]
 
 
@@ -1,7 +1,9 @@
 import re
 import unicodedata
 
-from .markdown import mdpage_markdown  # noqa
+from .compress import gzip_html, brotli_html, accepted_encodings, accepts_encoding  # noqa
+from .markdown import mdpage_markdown, mdpage_markdown_blocks  # noqa
+from .pagination import KeysetPaginator  # noqa
 
 
 def get_mdp_type_template_list(base_part, mdp_prefix=None):
@@ -0,0 +1,44 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def gzip_html(html):
+    return gzip.compress(html.encode(), mtime=0)
+
+
+def brotli_html(html):
+    return brotli.compress(html.encode(), mode=brotli.MODE_TEXT) if brotli else None
+
+
+def accepted_encodings(accept_encoding):
+    """
+    Parse an ``Accept-Encoding`` header value into a dict of lowercased content
+    codings and their q-values. Malformed q-values count as 1.
+    """
+    codings = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+
+        codings[coding.lower()] = q
+
+    return codings
+
+
+def accepts_encoding(codings, coding):
+    """The q-value given to ``coding`` by ``accepted_encodings`` output, 0 if refused."""
+    return codings.get(coding, codings.get('*', 0))
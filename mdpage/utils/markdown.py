@@ -1,6 +1,14 @@
 import re
+import hashlib
+import marshal
+import threading
+from collections import defaultdict, OrderedDict
+from functools import lru_cache, partial
 from markdown2 import Markdown
 
+from django.core.cache import caches
+from django.utils.functional import cached_property
+
 from ..conf import get_settings
 
 
@@ -48,9 +56,297 @@ class MDPageMarkdown(Markdown):
         return self._do_table_classes(text)
 
 
-def mdpage_markdown(text, mdp_type=None):
-    settings = get_settings(mdp_type.prefix if mdp_type else None)
-    return MDPageMarkdown({
-        k.replace('markdown_', '', 1): v for k, v in settings.items()
+class MarkdownPool:
+    """
+    Thread-safe pool of ``MDPageMarkdown`` converters, keyed on the resolved
+    markdown settings so that page types with identical settings share converters.
+    ``Markdown.convert`` resets all per-document state, so an idle converter
+    can safely be reused for the next document.
+    """
+
+    def __init__(self, factory=MDPageMarkdown):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.idle = defaultdict(list)
+
+    def acquire(self, key, settings):
+        with self.lock:
+            idle = self.idle[key]
+            if idle:
+                return idle.pop()
+
+        return self.factory(settings)
+
+    def release(self, key, md):
+        with self.lock:
+            self.idle[key].append(md)
+
+    def convert(self, text, settings):
+        key = tuple(sorted(settings.items()))
+        md = self.acquire(key, settings)
+        try:
+            return md.convert(text)
+        finally:
+            self.release(key, md)
+
+    def clear(self):
+        with self.lock:
+            self.idle.clear()
+
+
+pool = MarkdownPool()
+
+
+@lru_cache(maxsize=None)
+def get_markdown_settings(prefix=None):
+    return {
+        k.replace('markdown_', '', 1): v for k, v in get_settings(prefix).items()
         if k.startswith('markdown_')
-    }).convert(text)
+    }
+
+
+class RenderCache:
+    """
+    Two tier cache of rendered markdown: an in-process LRU, bounded by the total
+    characters of HTML it holds, in front of an optional Django cache backend.
+    Keys are a hash of the source text and the effective markdown settings, so
+    identical inputs are converted only once.
+    """
+
+    key_prefix = 'mdpage:md:'
+
+    def __init__(self, max_chars=4000000, alias=None, timeout=None):
+        self.max_chars = max_chars
+        self.chars = 0
+        self.alias = alias
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @cached_property
+    def backend(self):
+        return caches[self.alias] if self.alias else None
+
+    @staticmethod
+    def make_key(text, digest):
+        return hashlib.sha1(f'{digest}:{text}'.encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        html = self.backend.get(self.key_prefix + key) if self.backend else None
+        with self.lock:
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._store(key, html)
+
+        return html
+
+    def set(self, key, html):
+        with self.lock:
+            self._store(key, html)
+
+        if self.backend:
+            self.backend.set(self.key_prefix + key, html, self.timeout)
+
+    def _store(self, key, html):
+        if len(html) > self.max_chars:
+            return
+
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.chars -= len(previous)
+
+        self.entries[key] = html
+        self.chars += len(html)
+        while self.chars > self.max_chars:
+            self.chars -= len(self.entries.popitem(last=False)[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.chars = self.hits = self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'chars': self.chars,
+            'max_chars': self.max_chars,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_render_cache():
+    settings = get_settings()
+    return RenderCache(
+        max_chars=settings['render_cache_chars'],
+        alias=settings['render_cache_alias'],
+        timeout=settings['render_cache_timeout'],
+    )
+
+
+def fingerprint(value):
+    """
+    Describe a settings value for ``get_settings_digest``. Functions are
+    described by their code, defaults and closure, so that two lambdas are told
+    apart and editing a function's body changes its description; partials by
+    their parts; and other callables by ``repr``, which for most objects includes
+    ``id`` and so is only stable within a process.
+    """
+    if isinstance(value, partial):
+        return ('partial', fingerprint(value.func), value.args, sorted(value.keywords.items()))
+
+    code = getattr(value, '__code__', None)
+    if code is not None:
+        return (
+            getattr(value, '__module__', None),
+            getattr(value, '__qualname__', None),
+            hashlib.sha1(marshal.dumps(code)).hexdigest(),
+            repr(value.__defaults__),
+            repr(getattr(value, '__self__', None)),
+            repr([cell.cell_contents for cell in value.__closure__ or ()]),
+        )
+
+    return repr(value)
+
+
+@lru_cache(maxsize=None)
+def get_settings_digest(prefix=None):
+    """
+    Hash of the page type ``prefix`` and its markdown settings, which keys
+    rendered HTML in the render cache and in stored ``html_blocks``.
+    """
+    settings = get_markdown_settings(prefix)
+    return hashlib.sha1(repr([
+        prefix,
+        [(k, fingerprint(v)) for k, v in sorted(settings.items())],
+    ]).encode()).hexdigest()
+
+
+re_fence = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+re_list_item = re.compile(r'^ {0,3}([*+-]|\d+\.)\s')
+re_quote = re.compile(r'^ {0,3}>')
+re_cross_block = re.compile(r'\[\^|^ {0,3}\[[^\]]+\]:|^ {0,3}<[a-zA-Z]', re.M)
+re_header = re.compile(r'^#{1,6}[ \t]*(.+?)[ \t]*#*$|^(.+)\n(?:=+|-+)[ \t]*$', re.M)
+
+
+def split_blocks(text):
+    """
+    Split markdown source into top-level blocks: runs of lines separated by blank
+    lines, where indented continuations, fenced code and adjacent list items stay
+    with the block they belong to. Two constructs markdown2 parses across blank
+    lines are kept together too: a list that starts with an indented item goes
+    on with the list items after it, and a blockquote with indented content takes
+    in the block that follows.
+    """
+    blocks = []
+    current = []
+    fence = None
+    blank = False
+    in_list = in_quote = False
+    quote_continues = False
+    for line in text.splitlines():
+        if fence:
+            current.append(line)
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+
+        if not line.strip():
+            blank = True
+            current.append(line)
+            continue
+
+        is_list_item = bool(re_list_item.match(line.lstrip(' ')))
+        if blank and current and not line[0].isspace():
+            if quote_continues:
+                quote_continues = False
+            elif not (is_list_item and in_list):
+                blocks.append('\n'.join(current).strip('\n'))
+                current = []
+                in_list = in_quote = False
+
+        if blank and current and line[0].isspace() and in_quote:
+            quote_continues = True
+
+        blank = False
+        in_list = in_list or is_list_item
+        in_quote = in_quote or bool(re_quote.match(line.lstrip(' \t')))
+        current.append(line)
+        match = re_fence.match(line)
+        if match:
+            fence = match.group(1)
+
+    if current:
+        blocks.append('\n'.join(current).strip('\n'))
+
+    return blocks
+
+
+def has_cross_block_constructs(text):
+    """
+    Footnotes, reference link definitions, raw HTML blocks and duplicate header
+    ids (which markdown2 de-duplicates document wide) can't be rendered per block.
+    """
+    if re_cross_block.search(text):
+        return True
+
+    headers = [(a or b).strip().lower() for a, b in re_header.findall(text)]
+    return len(headers) != len(set(headers))
+
+
+def mdpage_markdown_blocks(text, mdp_type=None, previous=None):
+    """
+    Incrementally render ``text``, reusing the rendered HTML of any block in
+    ``previous`` whose source is unchanged. Returns a tuple of the HTML and the
+    list of ``[key, html]`` block pairs to pass as ``previous`` next time; the
+    list is empty if the document had to be rendered as a whole.
+    """
+    if has_cross_block_constructs(text):
+        return mdpage_markdown(text, mdp_type, cache=False), []
+
+    prefix = mdp_type.prefix if mdp_type else None
+    digest = get_settings_digest(prefix)
+    rendered = dict(previous or [])
+    blocks = []
+    for source in split_blocks(text):
+        key = RenderCache.make_key(source, digest)
+        html = rendered.get(key)
+        if html is None:
+            html = str(pool.convert(source, get_markdown_settings(prefix)))
+
+        blocks.append([key, html])
+
+    return '\n'.join(html for key, html in blocks), blocks
+
+
+def mdpage_markdown(text, mdp_type=None, cache=True):
+    """
+    Render ``text`` with the markdown settings of ``mdp_type``, through the
+    render cache unless ``cache`` is false, as for whole pages being saved,
+    whose exact text is rarely rendered again.
+    """
+    prefix = mdp_type.prefix if mdp_type else None
+    if not cache:
+        return str(pool.convert(text, get_markdown_settings(prefix)))
+
+    cache = get_render_cache()
+    key = cache.make_key(text, get_settings_digest(prefix))
+    html = cache.get(key)
+    if html is None:
+        html = str(pool.convert(text, get_markdown_settings(prefix)))
+        cache.set(key, html)
+
+    return html
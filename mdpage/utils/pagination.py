@@ -0,0 +1,153 @@
+import json
+import base64
+import binascii
+
+from django.db import connections, models
+
+Q = models.Q
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, has_previous, has_next, count=None):
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return KeysetPaginator.encode_cursor(self.object_list[0])
+
+        return None
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return KeysetPaginator.encode_cursor(self.object_list[-1])
+
+        return None
+
+
+class KeysetPaginator:
+    """
+    Paginate a page queryset in ``(title, pk)`` order by seeking past the last
+    row of the previous page, rather than with OFFSET and a full COUNT(*).
+    Cursors are opaque tokens encoding the ``(title, pk)`` of a page boundary.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+
+    @staticmethod
+    def encode_cursor(page):
+        return base64.urlsafe_b64encode(json.dumps([page.title, page.pk]).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Return the ``(title, pk)`` of ``cursor``, or None if it is invalid."""
+        try:
+            title, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, TypeError, UnicodeError):
+            return None
+
+        if isinstance(title, str) and isinstance(pk, int):
+            return title, pk
+
+        return None
+
+    def get_count(self):
+        if self.count == 'exact':
+            return self.queryset.count()
+
+        if self.count == 'estimate':
+            return estimate_count(self.queryset)
+
+        return None
+
+    def get_page(self, after=None, before=None, prefix=None):
+        """
+        Return the page following the ``after`` cursor, the page preceding the
+        ``before`` cursor, the page starting at the first title >= ``prefix``,
+        or else the first page. A ``before`` cursor with nothing preceding it
+        gives the first page; an ``after`` cursor or ``prefix`` past the last
+        row gives the last page.
+
+        Whether there are rows on the far side of the boundary is answered by an
+        ``EXISTS`` in the page query itself, so a page costs one query (plus
+        the count, if configured); only those edge cases take a second one.
+        ``prefix`` is compared as the database collates titles: under a
+        case-sensitive collation, such as SQLite's default, titles starting
+        with a lowercase letter sort after all uppercase ones, so a letter jump
+        lands among the uppercase titles only.
+        """
+        qs = self.queryset
+        size = self.per_page
+        after = after and self.decode_cursor(after)
+        before = before and self.decode_cursor(before)
+        if before:
+            title, pk = before
+            rows = self.fetch(
+                qs.filter(Q(title__lt=title) | Q(title=title, pk__lt=pk)),
+                qs.filter(Q(title__gt=title) | Q(title=title, pk__gte=pk)),
+                ('-title', '-pk'),
+            )
+            if rows:
+                return KeysetPage(
+                    rows[:size][::-1], len(rows) > size, rows[0].keyset_other, self.get_count()
+                )
+
+            after = prefix = None
+
+        if after:
+            title, pk = after
+            rows = self.fetch(qs.filter(Q(title__gt=title) | Q(title=title, pk__gt=pk)))
+            has_previous = True
+        elif prefix:
+            rows = self.fetch(qs.filter(title__gte=prefix), qs.filter(title__lt=prefix))
+            has_previous = rows[0].keyset_other if rows else True
+        else:
+            rows = self.fetch(qs)
+            has_previous = False
+
+        if not rows and has_previous:
+            return self.get_last_page()
+
+        return KeysetPage(rows[:size], has_previous, len(rows) > size, self.get_count())
+
+    def fetch(self, queryset, other=None, order=('title', 'pk')):
+        """
+        Fetch up to ``per_page + 1`` rows of ``queryset`` in ``order``, each
+        annotated with ``keyset_other``, whether ``other`` has any rows.
+        """
+        if other is not None:
+            queryset = queryset.annotate(keyset_other=models.Exists(other.order_by()))
+
+        return list(queryset.order_by(*order)[:self.per_page + 1])
+
+    def get_last_page(self):
+        rows = list(self.queryset.order_by('-title', '-pk')[:self.per_page + 1])
+        return KeysetPage(
+            rows[:self.per_page][::-1], len(rows) > self.per_page, False, self.get_count()
+        )
+
+
+def estimate_count(queryset):
+    """
+    The planner's row estimate for ``queryset`` on PostgreSQL, which avoids
+    scanning the rows; an exact count elsewhere.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -1,14 +1,22 @@
+import string
+from functools import partial
+
 from django import http
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404
-from django.utils.functional import cached_property
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils import timezone
+from django.utils.functional import cached_property, SimpleLazyObject
 from django.core.exceptions import ImproperlyConfigured
-from django.views.generic import ListView, CreateView, DetailView, UpdateView
+from django.views.generic import View, ListView, CreateView, DetailView, UpdateView
 from django.contrib.auth.mixins import UserPassesTestMixin
 
 from . import utils
+from .diffpatch import DiffHunks
 from .forms import MarkdownPageForm
 from .models import MarkdownPage, MarkdownPageType, MarkdownPageArchive
-from .diffpatch import DiffPatch
+from .utils.markdown import get_settings_digest
 
 
 class Permissions:
@@ -35,17 +43,18 @@ class Permissions:
     def __str__(self):
         return f'Auth(read={self.read}, write={self.write}, extras={self.extras})'
 
-    def check(self, user, perm):
+    def user_level(self, user):
         if user.is_superuser:
-            user_level = self.SUPERUSER
+            return self.SUPERUSER
         elif user.is_staff:
-            user_level = self.STAFF
+            return self.STAFF
         elif user.is_authenticated:
-            user_level = self.AUTHENTICATED
-        else:
-            user_level = self.ANONYMOUS
+            return self.AUTHENTICATED
 
-        return user_level >= getattr(self, perm, self.SUPERUSER)
+        return self.ANONYMOUS
+
+    def check(self, user, perm):
+        return self.user_level(user) >= getattr(self, perm, self.SUPERUSER)
 
 
 class PermissionMixin(UserPassesTestMixin):
@@ -99,32 +108,91 @@ class LandingView(BasePageMixin, ListView):
     permission_type = 'read'
     context_object_name = 'pages'
 
+    # the columns the listing templates use; never the page text or html
+    listing_fields = ('slug', 'title', 'status', 'pub_date', 'updated', 'type__prefix')
+
     def get_queryset(self):
-        return MarkdownPage.objects.published(type__prefix=self.namespace)
+        return MarkdownPage.objects.published(
+            type__prefix=self.namespace
+        ).select_related('type').only(*self.listing_fields).prefetch_related('tags')
+
+    def page_url(self, **params):
+        query = self.request.GET.copy()
+        for key in ('page', 'after', 'before', 'letter'):
+            query.pop(key, None)
+
+        query.update(params)
+        return f'{self.request.path}?{query.urlencode()}'
+
+    def paginate(self, pages, search):
+        """
+        Return a dict of a page of ``pages``, its ``count`` if known, and the
+        ``previous_url`` and ``next_url`` pages. Listings are paged by keyset
+        on ``(title, pk)``; search results, ordered by rank, by page number.
+        """
+        get_setting = self.mdp_type.get_setting
+        per_page = get_setting('listing_page_size')
+        GET = self.request.GET
+        if search:
+            paginator = Paginator(pages, per_page)
+            page = paginator.get_page(GET.get('page'))
+            previous = page.previous_page_number() if page.has_previous() else None
+            following = page.next_page_number() if page.has_next() else None
+            return {
+                'pages': page.object_list,
+                'count': paginator.count,
+                'previous_url': previous and self.page_url(page=previous),
+                'next_url': following and self.page_url(page=following),
+            }
+
+        paginator = utils.KeysetPaginator(pages, per_page, count=get_setting('listing_count'))
+        page = paginator.get_page(
+            after=GET.get('after'),
+            before=GET.get('before'),
+            prefix=GET.get('letter', '')[:1].upper(),
+        )
+        previous, following = page.previous_cursor, page.next_cursor
+        return {
+            'pages': page.object_list,
+            'count': page.count,
+            'previous_url': previous and self.page_url(before=previous),
+            'next_url': following and self.page_url(after=following),
+        }
 
     def get_context_data(self, **kwargs):
         mdp_type = self.mdp_type
         pages = self.object_list
         search = self.request.GET.get('search', '')
         if search:
-            pages = pages.search(search)
+            pages = pages.search(search, mdp_type)
 
         topic = self.request.GET.get('topic')
         if topic:
             pages = pages.filter(tags__name=topic)
 
+        # only queried if the listing fragment is not cached
+        listing = SimpleLazyObject(partial(self.paginate, pages, search))
+        letters = [] if search else [
+            (letter, self.page_url(letter=letter)) for letter in string.ascii_uppercase
+        ]
+
         if self.perms.check(self.request.user, 'write'):
-            pending = MarkdownPage.objects.unpublished(type__prefix=self.namespace)
+            pending = MarkdownPage.objects.unpublished(
+                type__prefix=self.namespace
+            ).select_related('type').only('slug', 'title', 'type__prefix')
         else:
             pending = []
 
         return super().get_context_data(
-            object_list=pages.order_by('title'),
+            object_list=pages,
             mdp_type=mdp_type,
             title='Page Listing',
             search=search,
             topic=topic,
             pending=pending,
+            listing=listing,
+            listing_key=None if search else self.request.get_full_path(),
+            letters=letters,
             **kwargs
         )
 
@@ -135,6 +203,9 @@ class PageViewMixin(BasePageMixin):
     def slug(self):
         return self.kwargs.get('slug', None)
 
+    def get_page_queryset(self):
+        return MarkdownPage.objects.select_related('type').defer('html_gzip', 'html_br')
+
     @cached_property
     def page(self):
         slug = self.slug
@@ -142,7 +213,7 @@ class PageViewMixin(BasePageMixin):
             return None
 
         page = get_object_or_404(
-            MarkdownPage.objects.select_related('type'),
+            self.get_page_queryset(),
             type__prefix=self.namespace,
             slug=slug
         )
@@ -165,11 +236,77 @@ class PageViewMixin(BasePageMixin):
         )
 
 
-class PageView(PageViewMixin, DetailView):
+class ConditionalPageMixin:
+    """
+    Answer conditional GETs from the page's validators alone, returning 304
+    before the page body is loaded or a template rendered.
+    """
+
+    def get_validators(self):
+        """
+        Return the ETag and Last-Modified time of the page, or ``(None, None)``
+        if it does not exist or the user may not see it, leaving the full view
+        to answer. The ETag covers the markdown settings digest, as
+        ``rerender_pages`` rewrites the HTML without touching ``updated``, and
+        Last-Modified any ``pub_date`` or ``end_date`` already passed.
+        """
+        row = MarkdownPage.objects.filter(
+            type__prefix=self.namespace,
+            slug=self.slug
+        ).values_list(
+            'updated', 'status', 'pub_date', 'end_date', 'type__updated'
+        ).first()
+        if row is None:
+            return None, None
+
+        updated, status, pub_date, end_date, type_updated = row
+        page = MarkdownPage(status=status, pub_date=pub_date, end_date=end_date)
+        is_published = page.is_published
+        if not (is_published or self.perms.check(self.request.user, 'write')):
+            return None, None
+
+        now = timezone.now()
+        etag = '"{}-{}-{}-{:d}-{}{}"'.format(
+            int(updated.timestamp() * 1000000),
+            int(type_updated.timestamp() * 1000000),
+            self.perms.user_level(self.request.user),
+            is_published,
+            get_settings_digest(self.namespace)[:12],
+            self.etag_suffix
+        )
+        last_modified = max(updated, type_updated, *(
+            date for date in (pub_date, end_date) if date is not None and date <= now
+        ))
+        return etag, last_modified
+
+    @property
+    def etag_suffix(self):
+        return ''
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        if etag:
+            last_modified = int(last_modified.timestamp())
+            response = get_conditional_response(request, etag, last_modified)
+            if response is None:
+                response = super().get(request, *args, **kwargs)
+
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+            return response
+
+        return super().get(request, *args, **kwargs)
+
+
+class PageView(ConditionalPageMixin, PageViewMixin, DetailView):
     template_name = 'page.html'
     as_text = False
     permission_type = 'read'
 
+    @property
+    def etag_suffix(self):
+        return '-text' if self.as_text else ''
+
     def render_to_response(self, *args, **kwargs):
         if self.as_text:
             return http.HttpResponse(
@@ -180,26 +317,105 @@ class PageView(PageViewMixin, DetailView):
         return super().render_to_response(*args, **kwargs)
 
 
+class PageFragmentView(PageViewMixin, View):
+    """
+    Serve the rendered page body alone, streaming the stored pre-compressed
+    bytes when the client accepts them.
+    """
+    permission_type = 'read'
+
+    def get_page_queryset(self):
+        return MarkdownPage.objects.select_related('type').defer('text', 'html_blocks')
+
+    def get(self, request, *args, **kwargs):
+        content, encoding = self.page.compressed_html(request.headers.get('accept-encoding', ''))
+        response = http.HttpResponse(content, content_type='text/html; charset=utf-8')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
 class PageHistoryView(PageView):
     template_name = 'history.html'
     permission_type = 'extras'
 
+    def get_archives(self):
+        archives = self.page.markdownpagearchive_set.defer('text')
+        paginator = Paginator(archives, self.page.type.get_setting('history_page_size'))
+        archives = paginator.get_page(self.request.GET.get('page'))
+        MarkdownPageArchive.set_authors(archives.object_list)
+        return archives
+
     def get_context_data(self, **kwargs):
+        kwargs.update(archives=self.get_archives())
         version = self.kwargs.get('version')
         if version:
             page = self.page
             archive = get_object_or_404(MarkdownPageArchive, page=page, pk=version)
-            diff = DiffPatch.diff(
-                archive.text, page.text,
-                their_filename=f'archive-{archive.pk}', our_filename='current',
-                their_ts=archive.created, our_ts=page.updated,
-                context=3
-            )
-            kwargs.update(archive=archive, diff=diff)
+            kwargs.update(archive=archive, diff=archive.diff(page))
 
         return super().get_context_data(**kwargs)
 
 
+class PageCompareView(PageViewMixin, View):
+    """
+    Compare two archived revisions of a page, or with ``current`` as ``b`` an
+    archived revision and the current text, returning the structured hunks of
+    the diff as JSON, ``compare_page_size`` hunks per page. ``?words=1`` adds
+    intra-line word differences to changed lines.
+    """
+    permission_type = 'extras'
+
+    def get_revisions(self):
+        """
+        Return the source archive and the target archive, or None for the
+        current text.
+        """
+        pks = [pk for pk in (self.kwargs['a'], self.kwargs.get('b')) if pk is not None]
+        archives = MarkdownPageArchive.objects.filter(page=self.page).in_bulk(pks)
+        if not all(pk in archives for pk in pks):
+            raise http.Http404('Revision not found')
+
+        source = archives[pks[0]]
+        return source, archives[pks[1]] if len(pks) > 1 else None
+
+    def page_url(self, number):
+        query = self.request.GET.copy()
+        query['page'] = number
+        return f'{self.request.path}?{query.urlencode()}'
+
+    def get(self, request, *args, **kwargs):
+        page = self.page
+        source, target = self.get_revisions()
+        if target is None:
+            target_text = page.text
+            target_info = {'id': 'current', 'created': page.updated, 'length': len(page.text)}
+        else:
+            target_text = target.full_text
+            target_info = {'id': target.pk, 'created': target.created, 'length': target.length}
+
+        get_setting = page.type.get_setting
+        hunks = DiffHunks(
+            source.full_text.splitlines(),
+            target_text.splitlines(),
+            algorithm=get_setting('diff_algorithm'),
+            words=request.GET.get('words') == '1',
+        )
+        paginator = Paginator(hunks, get_setting('compare_page_size'))
+        hunks = paginator.get_page(request.GET.get('page'))
+        return http.JsonResponse({
+            'source': {'id': source.pk, 'created': source.created, 'length': source.length},
+            'target': target_info,
+            'count': paginator.count,
+            'page': hunks.number,
+            'num_pages': paginator.num_pages,
+            'next': self.page_url(hunks.next_page_number()) if hunks.has_next() else None,
+            'hunks': hunks.object_list,
+        })
+
+
 class PageFormViewMixin(PageViewMixin):
     model = MarkdownPage
     form_class = MarkdownPageForm
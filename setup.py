@@ -20,6 +20,7 @@ setup(
     platforms=['any'],
     license='MIT License',
     install_requires=['django-taggit', 'choice_enum', 'markdown2', 'django-bootstrap5'],
+    extras_require={'brotli': ['brotli']},
     classifiers=(
         'Development Status :: 5 - Production/Stable',
         'Environment :: Web Environment',
@@ -0,0 +1,60 @@
+SECRET_KEY = 'mdpage-tests'
+USE_TZ = True
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+ROOT_URLCONF = 'tests.urls'
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'taggit',
+    'mdpage',
+]
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': [__file__.rsplit('/', 1)[0] + '/templates'],
+    'APP_DIRS': True,
+    'OPTIONS': {
+        'context_processors': [
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
+    },
+}]
+
+MARKDOWN_PAGE = {
+    'prefixes': {
+        'wiki': {
+            'archive_deltas': True,
+            'archive_keyframe_interval': 3,
+            'compress_html': True,
+            'diff_cache_table': True,
+            'markdown_mdpage_link': lambda title: f'/wiki/{title}/',
+        },
+        'docs': {
+            'fragment_cache_alias': 'default',
+            'markdown_mdpage_link': lambda title: f'/docs/{title}/',
+        },
+    },
+}
@@ -0,0 +1,165 @@
+from importlib import import_module
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from mdpage.conf import prefix_settings
+from mdpage.diffpatch import DiffPatch
+from mdpage.models import (
+    ArchiveDiff,
+    MarkdownPage,
+    MarkdownPageArchive,
+    MarkdownPageType,
+    apply_delta,
+    make_delta,
+)
+
+
+class TestDelta(TestCase):
+
+    def test_round_trip(self):
+        for newer, older in (
+            ('a\nb\nc\n', 'a\nB\nc\n'),
+            ('a\nb\nc', 'a\nb\nc\n'),
+            ('a\r\nb\r\n', 'a\nb\n'),
+            ('', 'text'),
+            ('same', 'same'),
+        ):
+            with self.subTest(newer=newer, older=older):
+                self.assertEqual(apply_delta(make_delta(newer, older), newer), older)
+
+    def test_migration_copy(self):
+        migration = import_module('mdpage.migrations.0007_markdownpagearchive_length')
+        lines = [f'Line {i}' for i in range(30)]
+        edited = lines[:2] + ['New'] + lines[2:10] + lines[11:25] + ['Changed'] + lines[26:]
+        for newer, older in (
+            ('a\nb\nc\n', 'a\nB\nc\n'),
+            ('a\nb\nc', 'a\nb\nc\n'),
+            ('a\r\nb\r\n', 'a\nb\n'),
+            ('', 'text'),
+            ('text', ''),
+            ('same', 'same'),
+            ('\n'.join(lines), '\n'.join(edited)),
+            ('\n'.join(edited), '\n'.join(lines)),
+        ):
+            with self.subTest(newer=newer, older=older):
+                delta = make_delta(newer, older)
+                self.assertEqual(migration.apply_delta(delta, newer), older)
+
+        self.assertIsNone(migration.apply_delta(make_delta('a\nb', 'a\nc'), 'x\ny'))
+
+
+class TestArchive(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mdp_type = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+
+    def make_revisions(self, count):
+        page = MarkdownPage.objects.create(
+            type=self.mdp_type,
+            title='Home',
+            text='Line\n' * 20,
+            status=MarkdownPage.Status.PUBLISHED
+        )
+        texts = [page.text]
+        for i in range(1, count):
+            lines = page.text.split('\n')
+            lines[i % 20] = f'Revision {i}'
+            page.text = '\r\n'.join(lines) if i % 4 == 0 else '\n'.join(lines).rstrip('\n')
+            page.save()
+            texts.append(page.text)
+
+        return page, texts
+
+    def test_full_text_round_trip(self):
+        page, texts = self.make_revisions(10)
+        archives = list(page.markdownpagearchive_set.order_by('pk'))
+        self.assertEqual([archive.full_text for archive in archives], texts[:-1])
+
+        # with a keyframe interval of 3, no more than 3 deltas precede a keyframe
+        runs = [archive.delta_run for archive in archives]
+        self.assertTrue(any(runs))
+        self.assertLessEqual(max(runs), 3)
+        self.assertEqual(runs[-1], 0)
+
+    def test_history_queries_are_constant(self):
+        def history_queries(page):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/wiki/home/history/')
+
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        page, texts = self.make_revisions(3)
+        few = history_queries(page)
+        for i in range(10):
+            page.text += f'\nMore {i}'
+            page.save()
+
+        self.assertEqual(history_queries(page), few)
+        self.assertEqual(MarkdownPageArchive.objects.filter(page=page).count(), 12)
+
+
+class TestArchiveDiff(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wiki = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+        cls.docs = MarkdownPageType.objects.create(prefix='docs', status='PUB')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def make_page(self, mdp_type):
+        page = MarkdownPage.objects.create(
+            type=mdp_type,
+            title='Home',
+            text='First line\nSecond line\n',
+            status=MarkdownPage.Status.PUBLISHED
+        )
+        page.text = 'First line\nChanged line\n'
+        page.save()
+        return page, page.markdownpagearchive_set.get()
+
+    def get_diff(self, page, archive):
+        with mock.patch.object(DiffPatch, 'diff', wraps=DiffPatch.diff) as diff:
+            response = self.client.get(f'/{page.type.prefix}/home/history/{archive.pk}/')
+
+        self.assertEqual(response.status_code, 200)
+        return response, diff.call_count
+
+    def test_table(self):
+        page, archive = self.make_page(self.wiki)
+        response, calls = self.get_diff(page, archive)
+        self.assertEqual(calls, 1)
+        self.assertContains(response, 'Changed line')
+        self.assertEqual(ArchiveDiff.objects.filter(archive=archive).count(), 1)
+
+        response, calls = self.get_diff(page, archive)
+        self.assertEqual(calls, 0)
+        self.assertContains(response, 'Changed line')
+
+        page.text = 'First line\nEdited again\n'
+        page.save()
+        self.assertFalse(ArchiveDiff.objects.filter(archive=archive).exists())
+
+        response, calls = self.get_diff(page, archive)
+        self.assertEqual(calls, 1)
+        self.assertContains(response, 'Edited again')
+
+    @mock.patch.dict(prefix_settings['docs'], diff_cache_alias='default')
+    def test_cache_alias(self):
+        page, archive = self.make_page(self.docs)
+        self.assertEqual(self.get_diff(page, archive)[1], 1)
+        self.assertEqual(self.get_diff(page, archive)[1], 0)
+        self.assertFalse(ArchiveDiff.objects.exists())
+
+        page.text = 'First line\nEdited again\n'
+        page.save()
+        response, calls = self.get_diff(page, archive)
+        self.assertEqual(calls, 1)
+        self.assertContains(response, 'Edited again')
@@ -0,0 +1,64 @@
+import datetime
+import gzip
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from mdpage.models import MarkdownPage, MarkdownPageArchive, MarkdownPageType
+
+
+class TestRerenderPages(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wiki = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+        cls.docs = MarkdownPageType.objects.create(prefix='docs', status='PUB')
+
+    def setUp(self):
+        self.pages = [
+            MarkdownPage.objects.create(type=mdp_type, title=title, text=f'# {title}\n\n*Text*.')
+            for mdp_type, title in ((self.wiki, 'One'), (self.wiki, 'Two'), (self.docs, 'Three'))
+        ]
+        MarkdownPage.objects.update(html='stale', html_blocks=[], html_gzip=None)
+        self.updated = dict(MarkdownPage.objects.values_list('pk', 'updated'))
+
+    def rerender(self, *args):
+        out = StringIO()
+        call_command('rerender_pages', '--workers', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def stale(self):
+        return set(MarkdownPage.objects.filter(html='stale').values_list('title', flat=True))
+
+    def test_rerender(self):
+        out = self.rerender()
+        self.assertIn('Re-rendered 3 pages', out)
+        self.assertEqual(self.stale(), set())
+
+        for page in MarkdownPage.objects.all():
+            self.assertIn('<em>Text</em>', page.html)
+            self.assertEqual('\n'.join(html for key, html in page.html_blocks), page.html)
+            if page.type == self.wiki:
+                self.assertEqual(gzip.decompress(page.html_gzip).decode(), page.html)
+            else:
+                self.assertIsNone(page.html_gzip)
+
+        self.assertFalse(MarkdownPageArchive.objects.exists())
+        self.assertEqual(dict(MarkdownPage.objects.values_list('pk', 'updated')), self.updated)
+
+    def test_prefix(self):
+        self.rerender('--prefix', 'docs')
+        self.assertEqual(self.stale(), {'One', 'Two'})
+
+    def test_since(self):
+        past = timezone.now() - datetime.timedelta(days=10)
+        MarkdownPage.objects.exclude(title='Two').update(updated=past)
+        self.rerender('--since', (past + datetime.timedelta(days=1)).date().isoformat())
+        self.assertEqual(self.stale(), {'One', 'Three'})
+
+    def test_dry_run(self):
+        out = self.rerender('--dry-run')
+        self.assertIn('Rendered (dry run) 3 pages', out)
+        self.assertEqual(self.stale(), {'One', 'Two', 'Three'})
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.test import RequestFactory, TestCase
+
+from mdpage.forms import MarkdownPageForm
+from mdpage.models import MarkdownPage, MarkdownPageType
+
+BASE = 'one\ntwo\nthree\nfour\nfive\n'
+
+
+class TestConcurrentEdit(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mdp_type = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+
+    def setUp(self):
+        self.page = MarkdownPage.objects.create(
+            type=self.mdp_type,
+            title='Home',
+            text=BASE,
+            status=MarkdownPage.Status.PUBLISHED
+        )
+        self.started = self.page.updated.isoformat()
+        self.request = RequestFactory().post('/wiki/home/edit/')
+        self.request.user = AnonymousUser()
+        self.request._messages = CookieStorage(self.request)
+
+    def save_theirs(self, text):
+        theirs = MarkdownPage.objects.get(pk=self.page.pk)
+        theirs.text = text
+        theirs.save()
+        return theirs
+
+    def make_form(self, text, timestamp=None):
+        return MarkdownPageForm(
+            data={
+                'title': 'Home',
+                'status': MarkdownPage.Status.PUBLISHED,
+                'text': text,
+                'tags': '',
+                'timestamp': timestamp or self.started,
+            },
+            initial={},
+            instance=MarkdownPage.objects.get(pk=self.page.pk),
+            request=self.request,
+            mdp_type=self.mdp_type,
+        )
+
+    def test_unchanged_page_saves(self):
+        form = self.make_form(BASE.replace('two', 'TWO'))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertFalse(form.merged)
+
+    def test_separate_changes_merge(self):
+        self.save_theirs(BASE.replace('five', 'FIVE'))
+        form = self.make_form(BASE.replace('one', 'ONE'))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertTrue(form.merged)
+        page = form.save()
+        page.refresh_from_db()
+        self.assertEqual(page.text, 'ONE\ntwo\nthree\nfour\nFIVE\n')
+
+    def test_conflict_is_marked_for_resubmission(self):
+        theirs = self.save_theirs(BASE.replace('three', 'THEIRS'))
+        form = self.make_form(BASE.replace('three', 'YOURS'))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.data['text'],
+            'one\ntwo\n<<<<<<< yours\nYOURS\n=======\nTHEIRS\n>>>>>>> current\nfour\nfive'
+        )
+        self.assertEqual(form.data['timestamp'], theirs.updated.isoformat())
+
+        resolved = self.make_form(BASE.replace('three', 'BOTH'), form.data['timestamp'])
+        self.assertTrue(resolved.is_valid(), resolved.errors)
+        self.assertFalse(resolved.merged)
+
+    def test_missing_base_keeps_text(self):
+        theirs = self.save_theirs(BASE.replace('five', 'FIVE'))
+        form = self.make_form('mine', timestamp='N/A')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.data['text'], 'mine')
+        self.assertEqual(form.data['timestamp'], theirs.updated.isoformat())
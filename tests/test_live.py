@@ -0,0 +1,94 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from mdpage.models import MarkdownPage, MarkdownPageType, next_boundary, update_live
+
+
+class TestLive(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wiki = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+
+    def make_page(self, title, **kwargs):
+        kwargs.setdefault('status', MarkdownPage.Status.PUBLISHED)
+        return MarkdownPage.objects.create(type=self.wiki, title=title, text='Text.', **kwargs)
+
+    def counts(self):
+        return {tag['name']: tag['count'] for tag in self.wiki.tags()}
+
+    def generation(self):
+        return MarkdownPageType.objects.get(pk=self.wiki.pk).generation
+
+    def test_published_follows_is_live(self):
+        now = timezone.now()
+        scheduled = self.make_page('Scheduled', pub_date=now + datetime.timedelta(hours=1))
+        ending = self.make_page('Ending', end_date=now + datetime.timedelta(hours=1))
+        self.assertFalse(scheduled.is_live)
+        self.assertTrue(ending.is_live)
+        self.assertEqual(list(MarkdownPage.objects.published(type=self.wiki)), [ending])
+        self.assertEqual(list(MarkdownPage.objects.unpublished(type=self.wiki)), [scheduled])
+
+        # Listing and topics agree until the boundary is processed
+        scheduled.tags.add('a')
+        response = self.client.get('/wiki/')
+        self.assertNotContains(response, 'Scheduled')
+        self.assertEqual(self.counts(), {})
+
+        update_live(now + datetime.timedelta(hours=1))
+        self.assertEqual(list(MarkdownPage.objects.published(type=self.wiki)), [scheduled])
+        response = self.client.get('/wiki/')
+        self.assertContains(response, 'Scheduled')
+        self.assertNotContains(response, 'Ending')
+        self.assertEqual(self.counts(), {'a': 1})
+
+    def test_update_live(self):
+        now = timezone.now()
+        scheduled = self.make_page('Scheduled', pub_date=now + datetime.timedelta(hours=1))
+        ending = self.make_page('Ending', end_date=now + datetime.timedelta(hours=2))
+        scheduled.tags.add('a')
+        ending.tags.add('a', 'b')
+        self.assertEqual(self.counts(), {'a': 1, 'b': 1})
+        self.assertEqual(next_boundary(now), scheduled.pub_date)
+
+        generation = self.generation()
+        self.assertEqual(update_live(now + datetime.timedelta(hours=1)), 1)
+        self.assertEqual(self.counts(), {'a': 2, 'b': 1})
+        self.assertEqual(self.generation(), generation + 1)
+        self.assertEqual(next_boundary(now + datetime.timedelta(hours=1)), ending.end_date)
+
+        self.assertEqual(update_live(now + datetime.timedelta(hours=2)), 1)
+        self.assertEqual(self.counts(), {'a': 1})
+        self.assertEqual(update_live(now + datetime.timedelta(hours=2)), 0)
+        self.assertEqual(self.generation(), generation + 2)
+        self.assertIsNone(next_boundary(now + datetime.timedelta(hours=2)))
+
+    def test_set_live_changes_each_row_once(self):
+        later = timezone.now() + datetime.timedelta(hours=1)
+        pks = [self.make_page(f'Page {i}', pub_date=later).pk for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sorted(MarkdownPage.objects.set_live(pks, True)), pks)
+
+        statements = [
+            query['sql'].split()[0] for query in queries.captured_queries
+            if 'SAVEPOINT' not in query['sql']
+        ]
+        self.assertEqual(statements, ['SELECT', 'UPDATE'])
+
+        self.assertEqual(MarkdownPage.objects.set_live(pks, True), [])
+        self.assertEqual(MarkdownPage.objects.set_live(pks[:2], False), pks[:2])
+
+    def test_command(self):
+        page = self.make_page('Page', pub_date=timezone.now() + datetime.timedelta(hours=1))
+        MarkdownPage.objects.filter(pk=page.pk).update(pub_date=timezone.now())
+
+        out = StringIO()
+        call_command('update_live_pages', stdout=out)
+        self.assertIn('1 pages went live or ended', out.getvalue())
+        self.assertTrue(MarkdownPage.objects.get(pk=page.pk).is_live)
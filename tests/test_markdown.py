@@ -0,0 +1,150 @@
+import random
+from pathlib import Path
+from functools import partial
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from mdpage.models import MarkdownPageType
+from mdpage.utils.markdown import (
+    RenderCache,
+    fingerprint,
+    get_render_cache,
+    get_settings_digest,
+    mdpage_markdown,
+    mdpage_markdown_blocks,
+    pool,
+)
+
+CHEATSHEET = Path(__file__).parent.parent / 'mdpage' / 'templates' / 'mdpage' / 'cheatsheet.text'
+
+
+class Linker:
+
+    def __call__(self, title):
+        return f'/linked/{title}/'
+
+
+def link(prefix, title):
+    return f'/{prefix}/{title}/'
+
+
+class TestRenderCache(SimpleTestCase):
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_digest_differs_per_prefix(self):
+        self.assertNotEqual(get_settings_digest('wiki'), get_settings_digest('docs'))
+        self.assertNotEqual(get_settings_digest(None), get_settings_digest('wiki'))
+
+    def test_prefixes_do_not_share_rendered_links(self):
+        wiki = mdpage_markdown('See [[Home]].', MarkdownPageType(prefix='wiki'))
+        docs = mdpage_markdown('See [[Home]].', MarkdownPageType(prefix='docs'))
+        self.assertIn('href="/wiki/Home/"', wiki)
+        self.assertIn('href="/docs/Home/"', docs)
+
+    def test_identical_source_is_converted_once(self):
+        cache = get_render_cache()
+        first = mdpage_markdown('Some *text*.')
+        second = mdpage_markdown('Some *text*.')
+        self.assertEqual(first, second)
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertEqual(cache.stats['hits'], 1)
+
+    def test_bounded_by_characters(self):
+        cache = RenderCache(max_chars=10)
+        for key in 'abc':
+            cache.set(key, key * 4)
+
+        self.assertEqual(list(cache.entries), ['b', 'c'])
+        self.assertEqual(cache.stats['chars'], 8)
+
+        cache.set('b', 'bb')
+        cache.set('d', 'd' * 5)
+        self.assertEqual(list(cache.entries), ['b', 'd'])
+        self.assertEqual(cache.stats['chars'], 7)
+
+        cache.set('e', 'e' * 11)
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(cache.stats['chars'], 7)
+
+    def test_whole_page_renders_skip_cache(self):
+        text = 'Text[^1].\n\n[^1]: A footnote.\n'
+        html, blocks = mdpage_markdown_blocks(text)
+        self.assertEqual(blocks, [])
+        self.assertEqual(html, mdpage_markdown(text, cache=False))
+        self.assertEqual(get_render_cache().stats['size'], 0)
+
+    def test_fingerprint_lambdas(self):
+        self.assertNotEqual(
+            fingerprint(lambda title: f'/a/{title}/'),
+            fingerprint(lambda title: f'/b/{title}/')
+        )
+
+        def make(prefix):
+            return lambda title: f'/{prefix}/{title}/'
+
+        self.assertNotEqual(fingerprint(make('a')), fingerprint(make('b')))
+        self.assertEqual(fingerprint(make('a')), fingerprint(make('a')))
+
+    def test_fingerprint_other_callables(self):
+        self.assertNotEqual(fingerprint(partial(link, 'a')), fingerprint(partial(link, 'b')))
+        self.assertEqual(fingerprint(partial(link, 'a')), fingerprint(partial(link, 'a')))
+        linker = Linker()
+        self.assertEqual(fingerprint(linker), fingerprint(linker))
+        self.assertNotEqual(fingerprint(linker), fingerprint(Linker()))
+
+
+class TestMarkdownBlocks(SimpleTestCase):
+    DOCUMENTS = [
+        (
+            '# Title\n\nPara one *em*.\n\n- a\n- b\n\n    code\n\n'
+            '```\nx\n\ny\n```\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\nLast [[Link]].\n'
+        ),
+        'Para\n\n1. one\n\n2. two\n\n> quote\n> more\n\nEnd',
+        'Text[^1].\n\n[^1]: A footnote.\n',
+        CHEATSHEET.read_text(),
+        'Intro:\n\n  - nested\n\n- item',
+        '> quote\n\n    code\n\nPara',
+        '> quote\n\n    code\n\nPara\n\nMore\n\n> again\n\nEnd',
+        'Lazy\n> quote\n\n\tcode\n\n# Header',
+    ]
+    PARTS = [
+        'Para *a*.', 'Intro:', 'Text\nmore', '   para', '# H', 'Setext\n===', '---',
+        '- item', '* star', '1. one', '  - nested', '  1. n', '    - indented',
+        '    code', '\tcode', '```\nx\n\ny\n```', '> quote', '> q\n> more', 'Lazy\n> q',
+        '| a | b |\n|---|---|\n| 1 | 2 |',
+    ]
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_blocks_match_full_render(self):
+        mdp_type = MarkdownPageType(prefix='wiki')
+        for text in self.DOCUMENTS:
+            with self.subTest(text=text[:20]):
+                html, blocks = mdpage_markdown_blocks(text, mdp_type)
+                self.assertEqual(html, mdpage_markdown(text, mdp_type))
+
+    def test_random_documents_match_full_render(self):
+        rng = random.Random(0)
+        for i in range(500):
+            text = '\n\n'.join(rng.choice(self.PARTS) for _ in range(rng.randint(2, 5)))
+            with self.subTest(text=text):
+                self.assertEqual(mdpage_markdown_blocks(text)[0], mdpage_markdown(text))
+
+    def test_only_changed_blocks_are_converted(self):
+        text = self.DOCUMENTS[0]
+        html, blocks = mdpage_markdown_blocks(text)
+        edited = text.replace('Para one', 'Paragraph one')
+        with mock.patch.object(pool, 'convert', wraps=pool.convert) as convert:
+            html, blocks = mdpage_markdown_blocks(edited, previous=blocks)
+
+        self.assertEqual(convert.call_count, 1)
+        self.assertEqual(html, mdpage_markdown(edited))
+
+    def test_cross_block_constructs_render_whole(self):
+        html, blocks = mdpage_markdown_blocks(self.DOCUMENTS[2])
+        self.assertEqual(blocks, [])
+        self.assertIn('footnote', html)
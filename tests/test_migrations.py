@@ -0,0 +1,53 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from mdpage.models import MarkdownPage, MarkdownPageType
+from mdpage.search import FTS_TABLE, SQLiteSearchBackend
+
+
+def fts_triggers():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            ['mdpage_markdownpage']
+        )
+        return sorted(name for name, in cursor.fetchall())
+
+
+TRIGGERS = [f'{FTS_TABLE}_ad', f'{FTS_TABLE}_ai', f'{FTS_TABLE}_au']
+
+
+class TestSearchIndex(TestCase):
+
+    def setUp(self):
+        if not SQLiteSearchBackend.is_available(connection):
+            self.skipTest('SQLite FTS5 is not available')
+
+    def test_saved_pages_are_indexed(self):
+        self.assertEqual(fts_triggers(), TRIGGERS)
+        mdp_type = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+        page = MarkdownPage.objects.create(type=mdp_type, title='Fresh', text='Searchable words.')
+        results = SQLiteSearchBackend().search(MarkdownPage.objects.all(), 'searchable')
+        self.assertEqual(list(results), [page])
+
+
+class TestIsLiveMigration(TransactionTestCase):
+
+    def setUp(self):
+        if not SQLiteSearchBackend.is_available(connection):
+            self.skipTest('SQLite FTS5 is not available')
+
+    def migrate(self, target=None):
+        executor = MigrationExecutor(connection)
+        targets = [('mdpage', target)] if target else executor.loader.graph.leaf_nodes('mdpage')
+        executor.migrate(targets)
+
+    def tearDown(self):
+        self.migrate()
+
+    def test_search_triggers_survive(self):
+        self.migrate('0010_markdownpagetype_generation')
+        self.assertEqual(fts_triggers(), TRIGGERS)
+        self.migrate('0011_is_live')
+        self.assertEqual(fts_triggers(), TRIGGERS)
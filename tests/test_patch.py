@@ -8,6 +8,8 @@ http://pypi.python.org/pypi/coverage/ and run this file with:
 
 """
 import sys
+import json
+import tempfile
 import unittest
 import subprocess
 from pathlib import Path
@@ -105,10 +107,53 @@ class TestPatchParse(unittest.TestCase):
         ps = patch.fromfile(tf("03trail_fname.patch"))
         self.assertEqual(ps.patches[0].header, [])
 
+    def test_iterparse_lines(self):
+        ps = patch.PatchSet()
+        lines = (line for line in readtf('git-changed-2-files.diff').splitlines(True))
+        patches = list(ps.iterparse(lines))
+        self.assertEqual(len(patches), 2)
+        self.assertEqual(len(ps), 0)
+        self.assertEqual(patches[0].type, patch.Patch.GIT)
+
+    def test_iterfile_diffstat(self):
+        ps = patch.fromfile(tf('git-changed-2-files.diff'))
+        self.assertEqual(len(ps), 2)
+        patches = patch.PatchSet.iterfile(tf('git-changed-2-files.diff'))
+        self.assertEqual(patch.PatchSet().diffstat(patches), ps.diffstat())
+
+    def test_diffstat_counts(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,2 +1,3 @@\n x\n-y\n+zz\n+w\n')
+        hunk = ps.patches[0].hunks[0]
+        self.assertEqual((hunk.inserted, hunk.deleted, hunk.delta), (2, 1, 3))
+        self.assertEqual(json.loads(ps.diffstat(format='json')), {
+            'files': [{'name': 'b', 'insertions': 2, 'deletions': 1, 'bytes': 3}],
+            'files_changed': 1,
+            'insertions': 2,
+            'deletions': 1,
+            'bytes': 3,
+        })
+        hunk.reverse()
+        self.assertEqual((ps.patches[0].inserted, ps.patches[0].deleted), (1, 2))
+
+    def test_hunk_lines(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,2 +1,2 @@\n x\n-y\n+z\n')
+        hunk = ps.patches[0].hunks[0]
+        self.assertEqual(list(hunk.text), [' x\n', '-y\n', '+z\n'])
+        self.assertEqual(hunk.text[-1], '+z\n')
+        self.assertEqual(hunk.lines(' -'), ['x', 'y'])
+        hunk.reverse()
+        self.assertEqual(hunk.text[1:], ['+y\n', '-z\n'])
+
     def test_hunk_desc(self):
         ps = patch.fromfile(tf('git-changed-file.diff'))
         self.assertEqual(ps.patches[0].hunks[0].desc, 'class JSONPluginMgr(object):')
 
+    def test_hunk_without_line_counts(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1 +1 @@\n-x\n+y\n')
+        self.assertTrue(ps)
+        self.assertEqual(ps.patches[0].hunks[0].lines_src, 1)
+        self.assertEqual(ps.apply('x\n').content, 'y\n')
+
     def test_fail_missing_hunk_line(self):
         data = readtf("failing/missing-hunk-line.diff")
         ps = patch.PatchSet()
@@ -131,3 +176,173 @@ class TestPatchApply(unittest.TestCase):
         ps = patch.fromfile(tf('03trail_fname.patch'))
         result = ps.apply(readtf('03trail_fname.from'))
         self.assertTrue(bool(result))
+
+    def test_apply_hunk_status(self):
+        ps = patch.fromfile(tf('02uni_newline.patch'))
+        result = ps.apply(readtf('02uni_newline.from'))
+        self.assertEqual(result.content, readtf('02uni_newline.to'))
+        self.assertEqual([h.status for h in result.hunks], [result.APPLIED] * len(ps.patches[0]))
+
+        result = ps.apply(readtf('02uni_newline.to'))
+        self.assertTrue(result)
+        self.assertEqual(result.content, readtf('02uni_newline.to'))
+        self.assertEqual({h.status for h in result.hunks}, {result.ALREADY_APPLIED})
+
+    def test_apply_conflict(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,2 +1,2 @@\n x\n-y\n+z\n')
+        result = ps.apply('x\nq\n')
+        self.assertFalse(result)
+        self.assertEqual(result.conflicts, 1)
+
+    def test_apply_with_offset(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,3 +1,3 @@\n x\n-y\n+z\n w\n')
+        result = ps.apply('new\nlines\nx\ny\nw\n')
+        self.assertEqual(result.content, 'new\nlines\nx\nz\nw\n')
+        self.assertEqual(result.hunks[0].offset, 2)
+        self.assertFalse(ps.apply('new\nlines\nx\ny\nw\n', max_offset=1))
+
+    def test_apply_with_fuzz(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,3 +1,3 @@\n x\n-y\n+z\n w\n')
+        self.assertFalse(ps.apply('X\ny\nw\n'))
+        result = ps.apply('X\ny\nw\n', fuzz=1)
+        self.assertEqual(result.content, 'X\nz\nw\n')
+        self.assertEqual(result.hunks[0].fuzz, 1)
+
+    def test_apply_no_newline_at_eof(self):
+        ps = patch.fromstring(
+            '--- a\n+++ b\n@@ -1,2 +1,2 @@\n x\n-y\n+z\n\\ No newline at end of file\n'
+        )
+        self.assertEqual(ps.apply('x\ny\n').content, 'x\nz')
+
+    def test_apply_splits_on_newlines_only(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,3 +1,3 @@\n a\x0cb\n-c\rd\n+e\n f\u2028g\n')
+        result = ps.apply('a\x0cb\nc\rd\nf\u2028g\n')
+        self.assertTrue(result)
+        self.assertEqual(result.content, 'a\x0cb\ne\nf\u2028g\n')
+
+    def test_apply_stream_of_lines(self):
+        ps = patch.fromstring('--- a\n+++ b\n@@ -1,2 +1,2 @@\n x\n-y\n+z\n')
+        result = ps.apply(patch.Stream(iter(['x\n', b'y\n'])))
+        self.assertEqual(result.content, 'x\nz\n')
+
+
+class TestPatchApplyAll(unittest.TestCase):
+
+    PATCH = (
+        '--- a/one.txt\n+++ b/one.txt\n@@ -1,2 +1,2 @@\n x\n-y\n+z\n'
+        '--- a/sub/two.txt\n+++ b/sub/two.txt\n@@ -1 +1,2 @@\n a\n+b\n'
+    )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / 'sub').mkdir()
+        (self.root / 'one.txt').write_text('x\ny\n')
+        (self.root / 'sub' / 'two.txt').write_text('a\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_apply_all(self):
+        result = patch.fromstring(self.PATCH).apply_all(self.root, strip=1)
+        self.assertTrue(result)
+        self.assertEqual(len(result.results), 2)
+        self.assertEqual((self.root / 'one.txt').read_text(), 'x\nz\n')
+        self.assertEqual((self.root / 'sub' / 'two.txt').read_text(), 'a\nb\n')
+
+    def test_apply_all_writes_nothing_on_failure(self):
+        (self.root / 'sub' / 'two.txt').write_text('q\n')
+        result = patch.fromstring(self.PATCH).apply_all(self.root, strip=1)
+        self.assertFalse(result)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual((self.root / 'one.txt').read_text(), 'x\ny\n')
+
+    def test_apply_all_rejects_paths_outside_root(self):
+        ps = patch.fromstring('--- ../x\n+++ ../x\n@@ -1 +1 @@\n-a\n+b\n')
+        self.assertFalse(ps.apply_all(self.root))
+
+
+class TestDiffAlgorithms(unittest.TestCase):
+
+    OURS = ['a', 'b', '', 'c', 'd', '', 'e']
+    THEIRS = ['a', 'B', '', 'c', '', 'e', 'f']
+
+    def test_unified_diff_format_matches_difflib(self):
+        import difflib
+        self.assertEqual(
+            list(patch.unified_diff(self.OURS, self.THEIRS, 'x', 'y', '1', '2', n=1)),
+            list(difflib.unified_diff(self.OURS, self.THEIRS, 'x', 'y', '1', '2', n=1))
+        )
+
+    def test_algorithms_round_trip(self):
+        theirs = '\n'.join(self.THEIRS) + '\n'
+        for algorithm in patch.DIFF_ALGORITHMS:
+            with self.subTest(algorithm=algorithm):
+                diff = patch.DiffPatch.diff(self.OURS, self.THEIRS, algorithm=algorithm)
+                result = patch.DiffPatch.patch(diff + '\n', '\n'.join(self.OURS) + '\n')
+                self.assertTrue(result)
+                self.assertEqual(str(result), theirs)
+
+    def test_myers_finds_longest_common_subsequence(self):
+        matcher = patch.MyersMatcher(None, 'abcabba', 'cbabac')
+        self.assertEqual(sum(block.size for block in matcher.get_matching_blocks()), 4)
+
+    def test_patience_anchors_on_unique_lines(self):
+        ours = ['}', 'one', '}', 'two', '}']
+        theirs = ['}', 'two', '}', 'one', '}']
+        matcher = patch.PatienceMatcher(None, ours, theirs)
+        self.assertIn((3, 1, 2), [tuple(block) for block in matcher.get_matching_blocks()])
+
+
+class TestDiffHunks(unittest.TestCase):
+
+    A = ['a', 'the quick fox', 'c', 'd', 'e', 'f', 'g', 'h', 'i']
+    B = ['a', 'the slow fox', 'c', 'd', 'e', 'f', 'g', 'h', 'x']
+
+    def test_hunks(self):
+        hunks = patch.DiffHunks(self.A, self.B, context=1)
+        self.assertEqual(len(hunks), 2)
+        self.assertEqual(hunks[1], {
+            'header': '@@ -8,2 +8,2 @@',
+            'source': [8, 2],
+            'target': [8, 2],
+            'lines': [
+                {'op': ' ', 'text': 'h'},
+                {'op': '-', 'text': 'i'},
+                {'op': '+', 'text': 'x'},
+            ],
+        })
+        self.assertEqual([h['header'] for h in hunks[:1]], ['@@ -1,3 +1,3 @@'])
+
+    def test_hunk_words(self):
+        lines = patch.DiffHunks(self.A, self.B, context=0, words=True)[0]['lines']
+        self.assertEqual(lines[0]['words'], [['=', 'the '], ['-', 'quick'], ['=', ' fox']])
+        self.assertEqual(lines[1]['words'], [['=', 'the '], ['+', 'slow'], ['=', ' fox']])
+
+
+class TestMerge(unittest.TestCase):
+
+    BASE = 'a\nb\nc\nd\ne\n'
+
+    def test_merge_non_overlapping(self):
+        result = patch.DiffPatch.merge(self.BASE, 'A\nb\nc\nd\ne\n', 'a\nb\nc\nd\nE\nf\n')
+        self.assertTrue(result)
+        self.assertEqual(result.content, 'A\nb\nc\nd\nE\nf\n')
+
+    def test_merge_identical_changes(self):
+        result = patch.DiffPatch.merge(self.BASE, 'a\nB\nc\nd\ne\n', 'a\nB\nc\nd\ne\n')
+        self.assertTrue(result)
+        self.assertEqual(result.content, 'a\nB\nc\nd\ne\n')
+
+    def test_merge_conflict(self):
+        result = patch.DiffPatch.merge(self.BASE, 'a\nX\nc\nd\ne\n', 'a\nY\nc\nd\ne\n')
+        self.assertFalse(result)
+        self.assertEqual(
+            result.content,
+            'a\n<<<<<<< ours\nX\n=======\nY\n>>>>>>> theirs\nc\nd\ne\n'
+        )
+
+    def test_merge_ignores_line_endings(self):
+        result = patch.DiffPatch.merge(self.BASE, 'A\r\nb\r\nc\r\nd\r\ne', 'a\nb\nc\nd\nE\n')
+        self.assertTrue(result)
+        self.assertEqual(result.content, 'A\r\nb\r\nc\r\nd\r\nE\n')
@@ -0,0 +1,75 @@
+from django.test import SimpleTestCase, TestCase
+
+from mdpage.models import MarkdownPage, MarkdownPageType
+from mdpage.search import InvertedIndex, InvertedIndexSearchBackend, stem, tokenize
+
+
+class TestStem(SimpleTestCase):
+
+    def test_inflections_agree(self):
+        for words in (
+            ('process', 'processes', 'processed', 'processing'),
+            ('glass', 'glasses'),
+            ('box', 'boxes'),
+            ('church', 'churches'),
+            ('wish', 'wishes'),
+            ('story', 'stories'),
+            ('page', 'pages'),
+            ('house', 'houses'),
+            ('buzz', 'buzzes'),
+            ('run', 'running'),
+            ('stop', 'stopped'),
+            ('meet', 'meeting', 'meetings'),
+        ):
+            with self.subTest(words=words):
+                self.assertEqual({stem(word) for word in words}, {words[0]})
+
+    def test_short_words_are_kept(self):
+        for word in ('is', 'gas', 'bus', 'yes', 'this', 'analysis', 'status', 'sing'):
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), word)
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize('Processing the Glasses, 2 boxes!'),
+            ['process', 'the', 'glass', '2', 'box']
+        )
+
+
+class TestInvertedIndex(SimpleTestCase):
+
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, 'Glasses', 'Cleaning processes for drinking glasses.')
+        self.index.add(2, 'Windows', 'A glass process, then drinking water.')
+
+    def test_words_match_inflections(self):
+        self.assertEqual(self.index.search('glass'), {1, 2})
+        self.assertEqual(self.index.search('processing'), {1, 2})
+        self.assertEqual(self.index.search('windows cleaning'), {1, 2})
+        self.assertEqual(self.index.search('absent'), set())
+
+    def test_phrases(self):
+        self.assertEqual(self.index.search('"drinking glass"'), {1})
+        self.assertEqual(self.index.search('"glass process"'), {2})
+
+    def test_remove(self):
+        self.index.remove(1)
+        self.assertEqual(self.index.search('glasses'), {2})
+        self.assertNotIn('clean', self.index.postings)
+
+
+class TestInvertedIndexSearchBackend(TestCase):
+
+    def test_search_follows_saves(self):
+        mdp_type = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+        page = MarkdownPage.objects.create(type=mdp_type, title='Glass', text='Processes.')
+        backend = InvertedIndexSearchBackend()
+        pages = MarkdownPage.objects.all()
+        self.assertEqual(list(backend.search(pages, 'glasses process', mdp_type)), [page])
+
+        page.text = 'Windows.'
+        page.save()
+        backend.page_saved(page)
+        self.assertEqual(list(backend.search(pages, 'processing', mdp_type)), [])
+        self.assertEqual(list(backend.search(pages, 'window', mdp_type)), [page])
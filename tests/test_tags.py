@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from mdpage.models import MarkdownPage, MarkdownPageType, TagCount
+
+
+class TestTagCounts(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wiki = MarkdownPageType.objects.create(prefix='wiki', status='PUB')
+        cls.docs = MarkdownPageType.objects.create(prefix='docs', status='PUB')
+
+    def make_page(self, title, mdp_type=None, status=MarkdownPage.Status.PUBLISHED):
+        return MarkdownPage.objects.create(
+            type=mdp_type or self.wiki,
+            title=title,
+            text=f'{title} text.',
+            status=status
+        )
+
+    def counts(self, mdp_type=None):
+        return {tag['name']: tag['count'] for tag in (mdp_type or self.wiki).tags()}
+
+    def assertCountsRebuild(self):
+        counts = {mdp_type: self.counts(mdp_type) for mdp_type in (self.wiki, self.docs)}
+        TagCount.objects.rebuild()
+        self.assertEqual(
+            {mdp_type: self.counts(mdp_type) for mdp_type in (self.wiki, self.docs)},
+            counts
+        )
+
+    def test_tagging(self):
+        one, two = self.make_page('One'), self.make_page('Two')
+        one.tags.add('a', 'b')
+        two.tags.add('b', 'c')
+        self.assertEqual(self.counts(), {'a': 1, 'b': 2, 'c': 1})
+
+        one.tags.remove('b')
+        self.assertEqual(self.counts(), {'a': 1, 'b': 1, 'c': 1})
+
+        two.tags.clear()
+        self.assertEqual(self.counts(), {'a': 1})
+        self.assertCountsRebuild()
+
+    def test_only_published_pages_count(self):
+        page = self.make_page('Draft', status=MarkdownPage.Status.PENDING)
+        page.tags.add('a')
+        self.assertEqual(self.counts(), {})
+
+        page.status = MarkdownPage.Status.PUBLISHED
+        page.save()
+        self.assertEqual(self.counts(), {'a': 1})
+
+        page.status = MarkdownPage.Status.WITHDRAWN
+        page.save()
+        self.assertEqual(self.counts(), {})
+        self.assertCountsRebuild()
+
+    def test_type_change_and_delete(self):
+        page = self.make_page('Moved')
+        page.tags.add('a')
+        page.type = self.docs
+        page.save()
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(self.counts(self.docs), {'a': 1})
+
+        page.delete()
+        self.assertEqual(self.counts(self.docs), {})
+        self.assertCountsRebuild()
+
+    def test_rebuild_command(self):
+        self.make_page('One').tags.add('a', 'b')
+        self.make_page('Two', self.docs).tags.add('a')
+        TagCount.objects.all().update(count=7)
+
+        out = StringIO()
+        call_command('rebuild_tag_counts', '--prefix', 'wiki', stdout=out)
+        self.assertIn('Rebuilt 2 tag counts', out.getvalue())
+        self.assertEqual(self.counts(), {'a': 1, 'b': 1})
+        self.assertEqual(self.counts(self.docs), {'a': 7})
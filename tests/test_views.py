@@ -0,0 +1,376 @@
+import datetime
+import gzip
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from mdpage.conf import prefix_settings
+from mdpage.models import MarkdownPage, MarkdownPageType
+from mdpage.utils import KeysetPaginator
+
+
+class ViewTestCase(TestCase):
+    prefix = 'wiki'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mdp_type = MarkdownPageType.objects.create(prefix=cls.prefix, status='PUB')
+
+    def make_pages(self, titles, **kwargs):
+        kwargs.setdefault('status', MarkdownPage.Status.PUBLISHED)
+        pages = []
+        for title in titles:
+            page = MarkdownPage.objects.create(
+                type=self.mdp_type,
+                title=title,
+                text=f'# {title}\n\nText of {title}.\n',
+                **kwargs
+            )
+            pages.append(page)
+
+        return pages
+
+
+class TestLandingView(ViewTestCase):
+
+    def get_listing(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/wiki/{query}')
+
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_constant(self):
+        for page in self.make_pages([f'Page {i:02}' for i in range(2)]):
+            page.tags.add('common', f'tag{page.pk % 3}')
+
+        response, few = self.get_listing()
+        self.assertContains(response, 'Page 01')
+
+        for page in self.make_pages([f'Page {i:02}' for i in range(2, 40)]):
+            page.tags.add('common', f'tag{page.pk % 3}')
+
+        response, many = self.get_listing()
+        self.assertContains(response, 'Page 39')
+        self.assertEqual(few, many)
+
+
+@mock.patch.dict(prefix_settings['wiki'], listing_page_size=2)
+class TestKeysetListing(ViewTestCase):
+
+    def setUp(self):
+        self.pages = self.make_pages(['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo'])
+
+    def get_listing(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        listing = response.context['listing']
+        return [page.title for page in listing['pages']], listing
+
+    def test_walk_forwards_and_backwards(self):
+        titles, listing = self.get_listing('/wiki/')
+        seen = titles
+        self.assertIsNone(listing['previous_url'])
+        while listing['next_url']:
+            titles, listing = self.get_listing(listing['next_url'])
+            seen += titles
+
+        self.assertEqual(seen, ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo'])
+
+        seen = titles
+        while listing['previous_url']:
+            titles, listing = self.get_listing(listing['previous_url'])
+            self.assertIsNotNone(listing['next_url'])
+            seen = titles + seen
+
+        self.assertEqual(seen, ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo'])
+
+    def test_letter(self):
+        titles, listing = self.get_listing('/wiki/?letter=c')
+        self.assertEqual(titles, ['Charlie', 'Delta'])
+        self.assertIsNotNone(listing['previous_url'])
+        self.assertIsNotNone(listing['next_url'])
+
+    def test_letter_past_last_title(self):
+        titles, listing = self.get_listing('/wiki/?letter=Z')
+        self.assertEqual(titles, ['Delta', 'Echo'])
+        self.assertIsNotNone(listing['previous_url'])
+        self.assertIsNone(listing['next_url'])
+
+    def test_after_last_row(self):
+        cursor = KeysetPaginator.encode_cursor(self.pages[-1])
+        self.pages[-1].delete()
+        titles, listing = self.get_listing(f'/wiki/?after={cursor}')
+        self.assertEqual(titles, ['Charlie', 'Delta'])
+        self.assertIsNone(listing['next_url'])
+
+    def test_before_first_row(self):
+        cursor = KeysetPaginator.encode_cursor(self.pages[0])
+        titles, listing = self.get_listing(f'/wiki/?before={cursor}')
+        self.assertEqual(titles, ['Alpha', 'Bravo'])
+        self.assertIsNone(listing['previous_url'])
+
+    def test_one_query_per_page(self):
+        paginator = KeysetPaginator(MarkdownPage.objects.all(), 2)
+        cursor = KeysetPaginator.encode_cursor(self.pages[2])
+        for kwargs, titles, has_previous, has_next in (
+            ({}, ['Alpha', 'Bravo'], False, True),
+            ({'after': cursor}, ['Delta', 'Echo'], True, False),
+            ({'before': cursor}, ['Alpha', 'Bravo'], False, True),
+            ({'prefix': 'B'}, ['Bravo', 'Charlie'], True, True),
+        ):
+            with self.subTest(**kwargs), self.assertNumQueries(1):
+                page = paginator.get_page(**kwargs)
+                self.assertEqual([row.title for row in page], titles)
+                self.assertEqual((page.has_previous, page.has_next), (has_previous, has_next))
+
+    def test_invalid_cursor(self):
+        cursor = KeysetPaginator.encode_cursor(SimpleNamespace(title=None, pk='x'))
+        titles, listing = self.get_listing(f'/wiki/?after={cursor}&before=%%%')
+        self.assertEqual(titles, ['Alpha', 'Bravo'])
+
+
+class TestFragmentCache(ViewTestCase):
+    prefix = 'docs'
+
+    def setUp(self):
+        caches['default'].clear()
+        self.page, = self.make_pages(['Alpha'])
+        self.page.tags.add('first')
+
+    def get_listing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/docs/')
+
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode(), len(queries)
+
+    def test_fragments_are_cached(self):
+        content, uncached = self.get_listing()
+        cached_content, cached = self.get_listing()
+        self.assertEqual(cached_content, content)
+        self.assertLess(cached, uncached)
+
+    def test_page_changes_invalidate(self):
+        content, queries = self.get_listing()
+        self.assertIn('Alpha', content)
+        self.make_pages(['Bravo'])
+        content, queries = self.get_listing()
+        self.assertIn('Bravo', content)
+
+        self.page.tags.add('second')
+        content, queries = self.get_listing()
+        self.assertIn('second', content)
+
+        self.page.delete()
+        content, queries = self.get_listing()
+        self.assertNotIn('Alpha', content)
+
+    def test_timeout_ends_at_next_boundary(self):
+        self.make_pages(['Later'], pub_date=timezone.now() + datetime.timedelta(seconds=30))
+        with mock.patch.object(LocMemCache, 'set', autospec=True) as cache_set:
+            self.get_listing()
+
+        timeouts = [call.args[3] for call in cache_set.call_args_list]
+        self.assertEqual(len(timeouts), 2)
+        self.assertTrue(all(0 < timeout <= 30 for timeout in timeouts), timeouts)
+
+
+class TestConditionalGet(ViewTestCase):
+
+    def setUp(self):
+        self.page, = self.make_pages(['Home'])
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/wiki/home/')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/wiki/home/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_save_changes_etag(self):
+        etag = self.client.get('/wiki/home/').headers['ETag']
+        self.page.text = 'Changed.'
+        self.page.save()
+        response = self.client.get('/wiki/home/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertContains(response, 'Changed.')
+
+    def test_text_view_has_own_etag(self):
+        etag = self.client.get('/wiki/home/').headers['ETag']
+        response = self.client.get('/wiki/home/text/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.content.decode(), self.page.text)
+
+    def test_settings_change_changes_etag(self):
+        etag = self.client.get('/wiki/home/').headers['ETag']
+        with mock.patch('mdpage.views.get_settings_digest', return_value='0' * 40):
+            response = self.client.get('/wiki/home/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_ended_page_is_not_answered_304(self):
+        response = self.client.get('/wiki/home/')
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        MarkdownPage.objects.filter(pk=self.page.pk).update(end_date=timezone.now())
+
+        response = self.client.get('/wiki/home/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/wiki/home/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 404)
+
+    def test_passed_end_date_is_last_modified(self):
+        self.client.force_login(User.objects.create_user('writer'))
+        last_modified = self.client.get('/wiki/home/').headers['Last-Modified']
+        end_date = timezone.now() + datetime.timedelta(seconds=2)
+        MarkdownPage.objects.filter(pk=self.page.pk).update(end_date=end_date)
+
+        with mock.patch('django.utils.timezone.now', return_value=end_date):
+            response = self.client.get('/wiki/home/', HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Last-Modified'], http_date(end_date.timestamp()))
+
+
+class TestPageFragment(ViewTestCase):
+
+    def setUp(self):
+        self.page, = self.make_pages(['Home'])
+
+    def get(self, accept_encoding=None):
+        headers = {} if accept_encoding is None else {'HTTP_ACCEPT_ENCODING': accept_encoding}
+        response = self.client.get('/wiki/home/fragment/', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        return response
+
+    def test_gzip(self):
+        response = self.get('gzip, deflate')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), self.page.html)
+
+    def test_plain_fallback(self):
+        for accept_encoding in (None, '', 'deflate', 'br;q=0, gzip;q=0', 'gzip;q=0, *'):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get(accept_encoding)
+                self.assertNotIn('Content-Encoding', response.headers)
+                self.assertEqual(response.content.decode(), self.page.html)
+
+    def test_wildcard(self):
+        self.assertEqual(self.get('*;q=0.5').headers['Content-Encoding'], 'gzip')
+
+    def test_unpublished_page(self):
+        MarkdownPage.objects.filter(pk=self.page.pk).update(status=MarkdownPage.Status.PENDING)
+        self.assertEqual(self.client.get('/wiki/home/fragment/').status_code, 404)
+
+    def test_compressed_html_prefers_highest_q(self):
+        page = MarkdownPage(html='<p>x</p>', html_gzip=b'gz', html_br=b'br')
+        for accept_encoding, encoding in (
+            ('gzip, br', 'br'),
+            ('br;q=0.5, gzip', 'gzip'),
+            ('BR;Q=1, gzip;q=0.9', 'br'),
+            ('br;q=0, gzip;q=0', None),
+            ('identity', None),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(page.compressed_html(accept_encoding)[1], encoding)
+
+
+class TestPageCompare(ViewTestCase):
+
+    def setUp(self):
+        self.page, = self.make_pages(['Home'])
+        self.revisions = [self.page.text]
+        for i in range(3):
+            lines = [f'Line {n}' for n in range(40)]
+            for n in range(0, 40, 10):
+                lines[n] = f'Revision {i} changed line {n}'
+            self.page.text = '\n'.join(lines)
+            self.page.save()
+            self.revisions.append(self.page.text)
+
+        self.archives = list(self.page.markdownpagearchive_set.order_by('pk'))
+
+    def compare(self, a, b, query='', prefix='wiki', slug='home', status=200):
+        response = self.client.get(f'/{prefix}/{slug}/history/{a}..{b}/{query}')
+        self.assertEqual(response.status_code, status)
+        return response.json() if status == 200 else response
+
+    def test_json_shape(self):
+        first, second = self.archives[1:3]
+        data = self.compare(first.pk, second.pk)
+        self.assertEqual(data['source']['id'], first.pk)
+        self.assertEqual(data['target']['id'], second.pk)
+        self.assertEqual(data['target']['length'], len(self.revisions[2]))
+        self.assertEqual((data['count'], data['page'], data['num_pages']), (4, 1, 1))
+        self.assertIsNone(data['next'])
+
+        hunk = data['hunks'][0]
+        self.assertEqual(set(hunk), {'header', 'source', 'target', 'lines'})
+        self.assertIn({'op': '-', 'text': 'Revision 0 changed line 0'}, hunk['lines'])
+        self.assertIn({'op': '+', 'text': 'Revision 1 changed line 0'}, hunk['lines'])
+        self.assertNotIn('words', hunk['lines'][0])
+
+    @mock.patch.dict(prefix_settings['wiki'], compare_page_size=3)
+    def test_pages(self):
+        first, second = self.archives[1:3]
+        data = self.compare(first.pk, second.pk)
+        self.assertEqual((len(data['hunks']), data['num_pages']), (3, 2))
+        self.assertIn('page=2', data['next'])
+
+        data = self.compare(first.pk, second.pk, '?page=2')
+        self.assertEqual((len(data['hunks']), data['page']), (1, 2))
+        self.assertIsNone(data['next'])
+
+    def test_words(self):
+        first, second = self.archives[1:3]
+        lines = self.compare(first.pk, second.pk, '?words=1')['hunks'][0]['lines']
+        removed = next(line for line in lines if line['op'] == '-')
+        self.assertIn(['=', ' changed line 0'], removed['words'])
+
+    def test_current(self):
+        data = self.compare(self.archives[-1].pk, 'current')
+        self.assertEqual(data['target']['id'], 'current')
+        self.assertEqual(data['target']['length'], len(self.page.text))
+        added = [line['text'] for hunk in data['hunks'] for line in hunk['lines']
+                 if line['op'] == '+']
+        self.assertIn('Revision 2 changed line 0', added)
+
+    def test_revision_of_other_page(self):
+        other, = self.make_pages(['Other'])
+        other.text = 'Changed.'
+        other.save()
+        archive = other.markdownpagearchive_set.get()
+        self.compare(self.archives[0].pk, archive.pk, status=404)
+        self.compare(archive.pk, 'current', status=404)
+
+    def test_extras_permission(self):
+        mdp_type = MarkdownPageType.objects.create(prefix='private', status='PUB')
+        page = MarkdownPage.objects.create(
+            type=mdp_type, title='Home', text='One.', status=MarkdownPage.Status.PUBLISHED
+        )
+        page.text = 'Two.'
+        page.save()
+        archive = page.markdownpagearchive_set.get()
+
+        self.compare(archive.pk, 'current', prefix='private', status=302)
+        self.client.force_login(User.objects.create_user('user'))
+        self.compare(archive.pk, 'current', prefix='private', status=403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.compare(archive.pk, 'current', prefix='private')
@@ -0,0 +1,11 @@
+from django.urls import path, include
+
+urlpatterns = [
+    path('wiki/', include(('mdpage.urls', 'wiki'), namespace='wiki')),
+    path('docs/', include(('mdpage.urls', 'docs'), namespace='docs')),
+    path(
+        'private/',
+        include(('mdpage.urls', 'private'), namespace='private'),
+        {'perms': {'read': 1, 'extras': 3}}
+    ),
+]